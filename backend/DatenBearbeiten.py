@@ -1,5 +1,14 @@
+import os
+
+import numpy as np
 import pandas as pd
 
+# float32 halbiert den Speicher der Kursspalten bei großen Backfills;
+# volume bleibt float64, weil float32 ab ~16 Mio. nicht mehr exakt zählt
+STOCK_FLOAT_DTYPE = np.dtype(os.environ.get("STOCK_FLOAT_DTYPE", "float64"))
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+
 def prepare_yahoo_data(df_raw: pd.DataFrame, ticker: str, source: str = "yahoo") -> pd.DataFrame:
 
     df = df_raw.copy()
@@ -130,3 +139,62 @@ def prepare_news_data(news_json: dict, query: str) -> pd.DataFrame:
     return df
 
 
+def _constant_category(value: str, length: int) -> pd.Categorical:
+    # ein Code pro Zeile statt eines Python-Strings pro Zeile
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+
+def build_stock_frame(dates, columns: dict, ticker: str, source: str,
+                      float_dtype=STOCK_FLOAT_DTYPE) -> pd.DataFrame:
+    """Aufbereiten und Bereinigen in einem Durchgang.
+
+    Gleiches Ergebnis wie prepare_*_data + clean_stock_data, aber mit festen dtypes,
+    einer Maske statt mehrerer Filter und höchstens einer Sortierung.
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    values = {col: np.asarray(columns[col], dtype=float_dtype) for col in PRICE_COLUMNS}
+    values["volume"] = np.asarray(columns["volume"], dtype=np.float64)
+    adj_close = columns.get("adj_close")
+    values["adj_close"] = values["close"] if adj_close is None else np.asarray(adj_close, dtype=float_dtype)
+
+    order = None if dates.is_monotonic_increasing else np.argsort(dates.asi8, kind="stable")
+    if order is not None:
+        dates = dates[order]
+
+    close = values["close"] if order is None else values["close"][order]
+    # NaN-Kurse fallen über den Vergleich mit 0 mit heraus; Duplikate erst danach, damit
+    # ein gültiger Kurs nicht wegen eines ungültigen Zwillings am selben Tag verloren geht
+    keep = (close > 0) & ~dates.isna()
+    valid = np.flatnonzero(keep)
+    keep[valid[dates[valid].duplicated(keep="first")]] = False
+
+    # Sortierung und Filter in einem einzigen Indexzugriff pro Spalte
+    index = np.flatnonzero(keep) if order is None else order[keep]
+    length = len(index)
+    frame = {"date": dates[keep]}
+    for col in ("open", "high", "low", "close", "volume"):
+        frame[col] = values[col][index]
+    frame["ticker"] = _constant_category(ticker, length)
+    frame["source"] = _constant_category(source, length)
+    frame["adj_close"] = values["adj_close"][index]
+    return pd.DataFrame(frame, copy=False)
+
+
+def empty_stock_frame(ticker: str, source: str, float_dtype=STOCK_FLOAT_DTYPE) -> pd.DataFrame:
+    columns = {col: [] for col in PRICE_COLUMNS + ["volume"]}
+    return build_stock_frame([], columns, ticker, source, float_dtype)
+
+
+def prepare_clean_yahoo_data(df_raw: pd.DataFrame, ticker: str, source: str = "yahoo",
+                             float_dtype=STOCK_FLOAT_DTYPE) -> pd.DataFrame:
+    columns = {col: df_raw[col.capitalize()].to_numpy() for col in PRICE_COLUMNS + ["volume"]}
+    return build_stock_frame(df_raw.index, columns, ticker, source, float_dtype)
+
+
+def prepare_clean_alpha_data(raw_dict: dict, ticker: str, source: str = "alpha_vantage",
+                             float_dtype=STOCK_FLOAT_DTYPE) -> pd.DataFrame:
+    rows = list(raw_dict.values())
+    keys = {"open": "1. open", "high": "2. high", "low": "3. low", "close": "4. close", "volume": "5. volume"}
+    # Alpha Vantage liefert die Werte teils als Strings; np.array wandelt beides um
+    columns = {col: np.array([row.get(key) for row in rows], dtype=np.float64) for col, key in keys.items()}
+    return build_stock_frame(list(raw_dict.keys()), columns, ticker, source, float_dtype)
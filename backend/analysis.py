@@ -1,22 +1,27 @@
+import hashlib
+import json
 import os
-import time
+import re
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+
+from database import sentimentCache
+from metrics import count_cache, count_upstream, span
+from quota import acquire, report_rate_limited
 
 load_dotenv()
 
 client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
-def analyze_news_content(title, description, topic):
-    """
-    Analysiert Nachrichten auf Sentiment und Relevanz bezüglich eines Tickers/Themas.
-    """
-    prompt = f"""
-    Du bist ein Experte in der Finanzanalyse. 
-    Analysiere die folgende Nachricht im Kontext des Themas '{topic}':
-    Titel: {title}
-    Beschreibung: {description}
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 20))
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 4))
+
+SCORE_PATTERN = re.compile(r"^(?:[+-](?:10|[1-9])|nicht relevant)$")
 
+RULES = """
     Regeln für deine Antwort:
     1. Ist die Nachricht relevant für das Thema '{topic}'? Falls nein, antworte NUR: "nicht relevant".
     2. Falls relevant: Bewerte, wie positiv oder negativ die Nachricht für den Aktienkurs ist (Skala 1 bis 10).
@@ -28,23 +33,154 @@ def analyze_news_content(title, description, topic):
     - Kein Bezug zum Thema: nicht relevant
     """
 
+
+class _GenerationError(Exception):
+    pass
+
+
+def content_hash(title, description) -> str:
+    return hashlib.sha256(f"{title or ''}\n{description or ''}".encode("utf-8")).hexdigest()
+
+
+def _generate(prompt, config=None) -> str:
     for attempt in range(3):
+        if not acquire("gemini"):
+            raise _GenerationError("Limit erreicht")
         try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-lite", 
-                contents=prompt,
-            )
+            with span("upstream_gemini"):
+                response = client.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=prompt,
+                    config=config,
+                )
+            count_upstream("gemini", "ok")
             return response.text.strip()
         except Exception as e:
             err_msg = str(e)
+            count_upstream("gemini", "429" if "429" in err_msg else "error")
             if "429" in err_msg:
-                print(f"Quota überschritten, warte 10s... (Versuch {attempt+1}/3)")
-                time.sleep(10)
+                # alle Prozesse pausieren; acquire() wartet beim nächsten Versuch
+                print(f"Quota überschritten (Versuch {attempt+1}/3)")
+                report_rate_limited("gemini")
                 continue
             print(f"KI-Fehler bei Analyse: {err_msg}")
-            return "Analyse fehlgeschlagen"
-    
-    return "Limit erreicht"
+            raise _GenerationError("Analyse fehlgeschlagen")
+
+    raise _GenerationError("Limit erreicht")
+
+
+def _cached_scores(hashes, topic) -> dict:
+    return {
+        doc.content_hash: doc.score
+        for doc in sentimentCache.objects(
+            content_hash__in=list(hashes), topic=topic, model=MODEL_NAME
+        ).only("content_hash", "score")
+    }
+
+
+def _store_scores(scores: dict, topic) -> None:
+    if not scores:
+        return
+    docs = [
+        {"content_hash": h, "topic": topic, "model": MODEL_NAME, "score": score}
+        for h, score in scores.items()
+    ]
+    try:
+        sentimentCache._get_collection().insert_many(docs, ordered=False)
+    except BulkWriteError:
+        pass  # parallel bereits gespeichert (Unique-Index)
+
+
+def analyze_news_content(title, description, topic):
+    """
+    Analysiert Nachrichten auf Sentiment und Relevanz bezüglich eines Tickers/Themas.
+    """
+    key = content_hash(title, description)
+    cached = _cached_scores([key], topic)
+    count_cache("sentiment", key in cached)
+    if key in cached:
+        return cached[key]
+
+    prompt = f"""
+    Du bist ein Experte in der Finanzanalyse. 
+    Analysiere die folgende Nachricht im Kontext des Themas '{topic}':
+    Titel: {title}
+    Beschreibung: {description}
+    {RULES.format(topic=topic)}"""
+
+    try:
+        score = _generate(prompt)
+    except _GenerationError as e:
+        return str(e)
+
+    if SCORE_PATTERN.match(score):
+        _store_scores({key: score}, topic)
+    return score
+
+
+def _score_batch(batch, topic) -> dict:
+    """Bewertet mehrere Artikel mit einem Prompt; liefert {content_hash: score}."""
+    lines = [
+        f"[{i}] Titel: {article.get('title')}\n    Beschreibung: {article.get('description')}"
+        for i, (_, article) in enumerate(batch)
+    ]
+    prompt = f"""
+    Du bist ein Experte in der Finanzanalyse. 
+    Analysiere jede der folgenden Nachrichten einzeln im Kontext des Themas '{topic}':
+    {chr(10).join(lines)}
+    {RULES.format(topic=topic)}
+    Antworte als JSON-Liste mit einem Objekt pro Nachricht, z.B.
+    [{{"id": 0, "bewertung": "+9"}}, {{"id": 1, "bewertung": "nicht relevant"}}]
+    """
+
+    try:
+        text = _generate(prompt, config={"response_mime_type": "application/json"})
+        items = json.loads(text)
+    except (_GenerationError, ValueError) as e:
+        print(f"Batch-Analyse fehlgeschlagen ({len(batch)} Artikel): {e}")
+        return {}
+
+    scores = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            idx = int(item.get("id"))
+            score = str(item.get("bewertung", "")).strip()
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if 0 <= idx < len(batch) and SCORE_PATTERN.match(score):
+            scores[batch[idx][0]] = score
+    return scores
+
+
+def analyze_news_batch(articles, topic, batch_size=BATCH_SIZE, max_concurrency=MAX_CONCURRENCY):
+    """
+    Bewertet viele Artikel ({'title', 'description'}) gebündelt und parallel.
+    Bereits bewertete Artikel kommen aus dem Cache; Ergebnis in Eingabereihenfolge.
+    """
+    keys = [content_hash(a.get("title"), a.get("description")) for a in articles]
+    scores = _cached_scores(set(keys), topic)
+
+    pending = {}
+    for key, article in zip(keys, articles):
+        if key not in scores:
+            pending.setdefault(key, article)
+    count_cache("sentiment", True, len(articles) - len(pending))
+    count_cache("sentiment", False, len(pending))
+
+    if pending:
+        items = list(pending.items())
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+            for result in pool.map(lambda b: _score_batch(b, topic), batches):
+                _store_scores(result, topic)
+                scores.update(result)
+        print(
+            f"Sentiment '{topic}': {len(articles) - len(pending)} aus Cache, "
+            f"{len(pending)} neu in {len(batches)} Batches."
+        )
+
+    return [scores.get(key, "Analyse fehlgeschlagen") for key in keys]
+
 
 if __name__ == "__main__":
     print(analyze_news_content(
@@ -64,4 +200,4 @@ if __name__ == "__main__":
     #     "Autoindustrie: BMW kommt schlechter durch die Krise", 
     #     "BMW hat seinen Gewinn im dritten Quartal -30% verloren",
     #     "BMW"
-    # ))
\ No newline at end of file
+    # ))
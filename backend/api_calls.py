@@ -1,84 +1,90 @@
 import requests
 import os
 import json
+import threading
 import yfinance as yf  
+from yfinance.exceptions import YFPricesMissingError
 import pandas as pd
 from dotenv import load_dotenv
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
+from coverage import last_settled_day, trading_days
+from database import alphaSeries, newsCursor
+from http_client import http_get
+from metrics import count_cache, count_upstream
+from quota import acquire, report_daily_exhausted, report_rate_limited
 
 load_dotenv()
 
 
-def get_news_from_news_api(query: str, from_date: str,to_date=None, sprache="de"):
-
-    from_date_obj = datetime.strptime(from_date, '%Y-%m-%d').date()
-    today = datetime.now().date()
-
-    if (today - from_date_obj).days > 29:
-        print(f"Fehler: Startdatum ist älter als 30 Tage. Das erlaubt der Free-Plan leider nicht.")
-        return None
+NEWS_URL = "https://newsapi.org/v2/everything"
+NEWS_WINDOWS = {"day": timedelta(days=1), "hour": timedelta(hours=1)}
+NEWS_MAX_WORKERS = int(os.getenv("NEWS_MAX_WORKERS", 4))
+NEWS_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
 
-    API_KEY = os.getenv("NEWS_API_KEY_1")
-    if not API_KEY:
-        print("Fehler: NEWS_API_KEY wurde nicht in der .env Datei gefunden.")
-        return None
 
-    url = "https://newsapi.org/v2/everything"
+def _walk_news_window(query: str, from_param: str, to_param: str, sprache: str, api_key: str,
+                      seen_titles: set, lock=None):
+    """Date-Walker für ein Zeitfenster. Liefert (Artikel, vollständig abgerufen)."""
+    lock = lock or threading.Lock()
 
     # 2. Variablen für den "Date-Walker"
-    current_to_date = datetime.now().isoformat()
-
-    all_articles = []
-    seen_titles = set()  # Set für schnelle Duplikat-Erkennung
-
-    print(f"Starte Abruf für '{query}' ab {from_date}...")
+    current_to_date = to_param
+    articles = []
 
     # 3. Die Schleife: Holt Daten, schiebt das Zeitfenster nach hinten
     while True:
         params = {
             'q': query,
             'searchIn': 'title',
-            'from': from_date,  # Bleibt statisch (der Start des Zeitraums)
+            'from': from_param,  # Bleibt statisch (der Start des Zeitraums)
             'to': current_to_date,  # Wird dynamisch in die Vergangenheit geschoben
             'language': sprache,
             'pageSize': 100,  # Maximum pro Request
-            'apiKey': API_KEY,
+            'apiKey': api_key,
             'sortBy': 'publishedAt'  # Wichtig: Neueste zuerst
         }
 
+        if not acquire("newsapi"):
+            print("NewsAPI-Quota erschöpft, Abruf wird mit den bisherigen Artikeln beendet.")
+            return articles, False
+
         try:
-            response = requests.get(url, params=params)
+            response = http_get("newsapi", NEWS_URL, params=params)
 
+            if response.status_code == 429:
+                # bei NewsAPI heißt 429 "Tageslimit erreicht": erneute Versuche wären nur weitere 429
+                report_daily_exhausted("newsapi")
+                return articles, False
 
             if response.status_code != 200:
                 print(f"API-Fehler bei Anfrage: {response.status_code} - {response.text}")
-                break
+                return articles, False
 
             data = response.json()
             batch = data.get("articles", [])
 
             if not batch:
-                print("Keine weiteren Artikel in diesem Zeitfenster gefunden.")
-                break
+                return articles, True
 
 
             new_articles_count = 0
-            for article in batch:
-                title = article.get('title')
-                # Nur hinzufügen, wenn wir den Titel noch nicht kennen
-                if title and title not in seen_titles:
-                    all_articles.append(article)
-                    seen_titles.add(title)
-                    new_articles_count += 1
+            with lock:
+                for article in batch:
+                    title = article.get('title')
+                    # Nur hinzufügen, wenn wir den Titel noch nicht kennen
+                    if title and title not in seen_titles:
+                        articles.append(article)
+                        seen_titles.add(title)
+                        new_articles_count += 1
 
             print(
-                f"  -> Batch geladen: {len(batch)} Artikel erhalten, davon {new_articles_count} neu. (Gesamt: {len(all_articles)})")
+                f"  -> Batch geladen ({from_param} bis {current_to_date}): {len(batch)} Artikel erhalten, davon {new_articles_count} neu.")
 
 
             if len(batch) < 100:
-                print("Ende der Ergebnisse erreicht (Batch < 100).")
-                break
+                return articles, True
 
             last_article = batch[-1]
             last_date = last_article.get('publishedAt')
@@ -86,45 +92,181 @@ def get_news_from_news_api(query: str, from_date: str,to_date=None, sprache="de"
 
             if last_date == current_to_date:
                 print("Warnung: Zeitstempel bewegt sich nicht mehr vorwärts. Abbruch um Loop zu verhindern.")
-                break
+                return articles, True
 
             current_to_date = last_date
 
         except requests.exceptions.RequestException as e:
             print(f"Netzwerkfehler aufgetreten: {e}")
-            break
+            return articles, False
         except Exception as e:
             print(f"Unerwarteter Fehler: {e}")
-            break
+            return articles, False
+
 
+def _news_preconditions(from_date: str):
+    from_date_obj = datetime.strptime(from_date, '%Y-%m-%d').date()
+    today = datetime.now().date()
+
+    if (today - from_date_obj).days > 29:
+        print(f"Fehler: Startdatum ist älter als 30 Tage. Das erlaubt der Free-Plan leider nicht.")
+        return None
+
+    API_KEY = os.getenv("NEWS_API_KEY_1")
+    if not API_KEY:
+        print("Fehler: NEWS_API_KEY wurde nicht in der .env Datei gefunden.")
+        return None
+    return API_KEY
+
+
+def _news_result(all_articles: list, **extra):
     if all_articles:
         print(f"Abruf erfolgreich beendet. {len(all_articles)} Artikel gesammelt.")
         return {
             "status": "ok",
             "totalResults": len(all_articles),
-            "articles": all_articles
+            "articles": all_articles,
+            **extra,
         }
     else:
         print("Keine Artikel gefunden oder Fehler beim Abruf.")
         return None
 
+
+def get_news_from_news_api(query: str, from_date: str,to_date=None, sprache="de"):
+
+    API_KEY = _news_preconditions(from_date)
+    if API_KEY is None:
+        return None
+
+    print(f"Starte Abruf für '{query}' ab {from_date}...")
+
+    all_articles, _ = _walk_news_window(
+        query, from_date, datetime.now().isoformat(), sprache, API_KEY, seen_titles=set()
+    )
+    return _news_result(all_articles)
+
+
+def _news_windows(from_date: str, window: str):
+    step = NEWS_WINDOWS[window]
+    now = datetime.utcnow()
+    start = datetime.strptime(from_date, '%Y-%m-%d')
+    windows = []
+    while start < now:
+        end = min(start + step, now)
+        windows.append((start, end, end < start + step))   # (start, ende, noch offen)
+        start += step
+    return windows
+
+
+def mark_news_windows(query: str, sprache: str, window_keys) -> None:
+    """Speichert abgeschlossene Zeitfenster im Cursor; erst nach dem Speichern der Artikel aufrufen."""
+    if not window_keys:
+        return
+    newsCursor.objects(query=query, language=sprache).update_one(
+        add_to_set__completed=list(window_keys), set__updated_at=datetime.utcnow(), upsert=True
+    )
+    # Fenster außerhalb der 30 Tage des Free-Plans werden nie mehr abgefragt
+    horizon = (datetime.utcnow() - timedelta(days=31)).strftime(NEWS_TIME_FORMAT)
+    newsCursor.objects(query=query, language=sprache).update_one(pull__completed__lt=horizon)
+
+
+def get_news_from_news_api_parallel(query: str, from_date: str, sprache="de", window="day",
+                                    max_workers=NEWS_MAX_WORKERS):
+    """Teilt [from_date, jetzt] in Tages- oder Stundenfenster und ruft sie parallel ab.
+
+    Fenster, die laut Cursor bereits vollständig abgerufen wurden, werden übersprungen.
+    Die neu abgeschlossenen Fenster stehen in ``completedWindows`` und werden über
+    ``mark_news_windows`` festgeschrieben, sobald die Artikel gespeichert sind.
+    """
+    API_KEY = _news_preconditions(from_date)
+    if API_KEY is None:
+        return None
+
+    cursor = newsCursor.objects(query=query, language=sprache).first()
+    done = set(cursor.completed) if cursor else set()
+
+    pending = [
+        (start, end, is_open) for start, end, is_open in _news_windows(from_date, window)
+        if start.strftime(NEWS_TIME_FORMAT) not in done
+    ]
+    print(f"Starte parallelen Abruf für '{query}' ab {from_date}: {len(pending)} offene Fenster ({window}).")
+
+    seen_titles = set()
+    lock = threading.Lock()
+
+    def fetch(window_range):
+        start, end, _ = window_range
+        return _walk_news_window(
+            query, start.strftime(NEWS_TIME_FORMAT), end.strftime(NEWS_TIME_FORMAT),
+            sprache, API_KEY, seen_titles, lock,
+        )
+
+    all_articles = []
+    completed = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for (start, _, is_open), (articles, complete) in zip(pending, pool.map(fetch, pending)):
+            all_articles.extend(articles)
+            if complete and not is_open:
+                completed.append(start.strftime(NEWS_TIME_FORMAT))
+
+    print(f"Paralleler Abruf beendet: {len(all_articles)} Artikel, {len(completed)} Fenster abgeschlossen.")
+    # auch ohne Artikel zurückgeben, damit leere Fenster im Cursor landen
+    return {
+        "status": "ok",
+        "totalResults": len(all_articles),
+        "articles": all_articles,
+        "completedWindows": completed,
+        "language": sprache,
+    }
+
+# yfinance verschluckt Netzwerk-/HTTP-Fehler sonst und liefert einen leeren DataFrame,
+# der von "keine Kurse im Zeitraum" nicht zu unterscheiden ist
+yf.config.debug.hide_exceptions = False
+
+
 def get_stock_data_yfinance(thema: str, start_date: str, end_date: str):
     try:
         stock=yf.Ticker(thema)
         
         hist_data = stock.history(start=start_date, end=end_date)
-        if hist_data.empty:
-            print(f"Fehler (yfinance): Keine Daten für Ticker '{thema}' im Zeitraum gefunden.")
+    except YFPricesMissingError as e:
+        if "status_code" in str(e):
+            # HTTP-Fehler von Yahoo, kein inhaltliches "keine Kurse"
+            count_upstream("yahoo", "error")
+            print(f"Ein Fehler mit yfinance ist aufgetreten: {e}")
             return None
-            
-        print(f"API-Anfrage (yfinance) für '{thema}' erfolgreich.")
-        return hist_data
+        hist_data = pd.DataFrame()
     except Exception as e:
+        count_upstream("yahoo", "error")
         print(f"Ein Fehler mit yfinance ist aufgetreten: {e}")
         return None
+
+    if hist_data.empty:
+        # leer statt None: Yahoo hat geantwortet, nur ohne Kurse (z.B. Sonderschließung)
+        count_upstream("yahoo", "empty")
+        print(f"Hinweis (yfinance): Keine Daten für Ticker '{thema}' im Zeitraum gefunden.")
+        return hist_data
+
+    count_upstream("yahoo", "ok")
+    print(f"API-Anfrage (yfinance) für '{thema}' erfolgreich.")
+    return hist_data
     
-def get_stock_data_alpha_vantage(thema: str, start_date: str, end_date: str) -> dict | None:
-    
+ALPHA_COLUMNS = {
+    "1. open": "open",
+    "2. high": "high",
+    "3. low": "low",
+    "4. close": "close",
+    "5. adjusted close": "adj_close",
+    "5. volume": "volume",
+    "6. volume": "volume",
+}
+ALPHA_SERIES_FIELDS = ["open", "high", "low", "close", "adj_close", "volume"]
+ALPHA_COMPACT_DAYS = 100   # so viele Handelstage liefert outputsize=compact
+ALPHA_MIN_REFRESH = timedelta(minutes=int(os.getenv("ALPHA_MIN_REFRESH_MINUTES", 60)))
+
+
+def _request_alpha_series(thema: str, outputsize: str) -> dict | None:
     API_KEY = os.getenv("ALPHA_VANTAGE_KEY")
     
     if not API_KEY:
@@ -136,48 +278,128 @@ def get_stock_data_alpha_vantage(thema: str, start_date: str, end_date: str) ->
     params = {
         "function": "TIME_SERIES_DAILY_ADJUSTED",
         "symbol": thema,
-        "outputsize": "full", # historische Daten
+        "outputsize": outputsize,  # "full" nur beim ersten Abruf, danach "compact"
         "apikey": API_KEY,
         "datatype": "json"
     }
     
+    if not acquire("alpha_vantage"):
+        return None
+
     try:
-        response = requests.get(url, params=params)
+        response = http_get("alpha_vantage", url, params=params)
         
         if response.status_code != 200:
             print(f"Fehler bei AlphaVantage-Anfrage: Status Code {response.status_code}")
             return None
             
         data = response.json()
-        print(data)
 
         if "Error Message" in data:
             print(f"API-Fehler (AlphaVantage): {data['Error Message']}")
             return None
-        if "Note" in data:
-            print(f"API-Hinweis (AlphaVantage): {data['Note']} ")
+        if "Note" in data or "Information" in data:
+            # Alpha Vantage meldet Rate-Limits mit HTTP 200 und einem Hinweistext
+            print(f"API-Hinweis (AlphaVantage): {data.get('Note') or data.get('Information')} ")
+            report_rate_limited("alpha_vantage")
             return None
-        
-        start_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-        end_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-        
+
         time_series_data = data.get("Time Series (Daily)", {})
-        filtered_data = {}
-        
-        for date_str, values in time_series_data.items():
-            current_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            if start_obj <= current_date <= end_obj:
-                filtered_data[date_str] = values
-                
-        if not filtered_data:
-            print(f"Fehler (AlphaVantage): Keine Daten für thema '{thema}' im Zeitraum {start_date} bis {end_date} gefunden.")
-            return None
-        
-        return filtered_data
+        print(f"API-Anfrage (AlphaVantage, {outputsize}) für '{thema}': {len(time_series_data)} Tage.")
+        return time_series_data
 
     except requests.exceptions.RequestException as e:
         print(f"Ein Fehler mit der Netzwerkverbindung ist aufgetreten: {e}")
         return None  
+
+
+def _parse_alpha_series(time_series_data: dict) -> pd.DataFrame:
+    df = pd.DataFrame.from_dict(time_series_data, orient="index").rename(columns=ALPHA_COLUMNS)
+    for col in ALPHA_SERIES_FIELDS:
+        df[col] = pd.to_numeric(df[col], errors="coerce") if col in df.columns else float("nan")
+    if df["adj_close"].isna().all():
+        df["adj_close"] = df["close"]
+    df.index.name = "date"
+    return df[ALPHA_SERIES_FIELDS].sort_index()
+
+
+def _load_alpha_cache(thema: str):
+    doc = alphaSeries.objects(symbol=thema).first()
+    if doc is None:
+        return None, None
+    df = pd.DataFrame({col: getattr(doc, col) for col in ALPHA_SERIES_FIELDS}, index=pd.Index(doc.dates, name="date"))
+    return df, doc.fetched_at
+
+
+def _save_alpha_cache(thema: str, df: pd.DataFrame) -> None:
+    alphaSeries.objects(symbol=thema).update_one(
+        set__fetched_at=datetime.utcnow(),
+        set__dates=df.index.tolist(),
+        upsert=True,
+        **{f"set__{col}": df[col].astype(float).tolist() for col in ALPHA_SERIES_FIELDS},
+    )
+
+
+def _last_trading_day(until):
+    days = trading_days(until - timedelta(days=10), until)
+    return days[-1].date() if len(days) else until
+
+
+def _alpha_series(thema: str, needed_through):
+    """Liefert die komplette Tagesreihe aus dem Cache und aktualisiert sie nur, wenn sie
+    nicht bis ``needed_through`` (letzter gebrauchter abgeschlossener Handelstag) reicht."""
+    cached, fetched_at = _load_alpha_cache(thema)
+    today = datetime.now().date()
+
+    outputsize = "full"
+    if cached is not None and not cached.empty:
+        last_date = datetime.strptime(cached.index[-1], '%Y-%m-%d').date()
+        if last_date >= needed_through or datetime.utcnow() - fetched_at < ALPHA_MIN_REFRESH:
+            count_cache("alpha_series", True)
+            return cached
+        if len(trading_days(last_date + timedelta(days=1), today)) < ALPHA_COMPACT_DAYS:
+            outputsize = "compact"
+    count_cache("alpha_series", False)
+
+    time_series_data = _request_alpha_series(thema, outputsize)
+    if not time_series_data:
+        return cached  # lieber veraltete Daten als gar keine
+
+    fresh = _parse_alpha_series(time_series_data)
+    if outputsize == "compact":
+        fresh = pd.concat([cached[~cached.index.isin(fresh.index)], fresh]).sort_index()
+
+    _save_alpha_cache(thema, fresh)
+    return fresh
+
+
+def get_stock_data_alpha_vantage(thema: str, start_date: str, end_date: str) -> dict | None:
+
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    needed = _last_trading_day(min(end, last_settled_day()))
+    series = _alpha_series(thema, needed)
+    if series is None:
+        return None
+
+    # Cache reicht nicht bis zum gebrauchten Tag (gedrosselter oder fehlgeschlagener Refresh,
+    # Tageskurs noch nicht veröffentlicht): kein "keine Kurse", sondern später erneut versuchen
+    if needed.isoformat() >= start_date and (series.empty or series.index[-1] < needed.isoformat()):
+        print(f"AlphaVantage-Reihe für '{thema}' reicht nur bis {series.index[-1] if not series.empty else '-'}, "
+              f"gebraucht bis {needed}.")
+        return None
+
+    # ISO-Datumsstrings lassen sich direkt lexikografisch vergleichen
+    filtered = series[(series.index >= start_date) & (series.index <= end_date)]
+
+    if filtered.empty:
+        # leeres dict statt None: die Reihe wurde geladen, hat in dem Zeitraum aber keine Kurse
+        print(f"Hinweis (AlphaVantage): Keine Daten für thema '{thema}' im Zeitraum {start_date} bis {end_date} gefunden.")
+        return {}
+
+    # gleiches Format wie die Rohantwort, damit prepare_alpha_data unverändert bleibt
+    filtered = filtered.rename(columns={"open": "1. open", "high": "2. high", "low": "3. low",
+                                        "close": "4. close", "volume": "5. volume"})
+    return filtered[["1. open", "2. high", "3. low", "4. close", "5. volume"]].to_dict(orient="index")
     
     
 
@@ -2,35 +2,72 @@
 
 from __future__ import annotations
 
-from datetime import date, datetime
-from typing import Any, Dict, List
+import os
+from datetime import date, datetime, timedelta
 
-import pandas as pd  # für pd.isna Check
-from flask import Flask, jsonify, request, render_template
+import pandas as pd
+from flask import Flask, Response, jsonify, request, render_template
 from flask_cors import CORS
 
 from save_data import (
+    ensure_news_data,
+    decode_news_cursor,
+    ensure_stock_data,
     fetch_and_store_stock_data,
-    fetch_and_store_news_data
+    fetch_and_store_stock_data_many,
+    iter_news_articles,
+    news_data_state,
+    read_news_data,
+    read_news_page,
+    read_stock_frame,
+    stock_data_state,
 )
+from database import ensure_indexes
+from http_cache import (
+    MAX_AGE_LIVE,
+    apply_cache_headers,
+    build_validator,
+    is_not_modified,
+    max_age_for,
+    not_modified_response,
+)
+from forecast import DEFAULT_HORIZON, LOOKBACK_DAYS, MAX_HORIZON, MODELS, cached_forecast
+from indicators import cached_indicators, parse_indicator_names
+from constants import SUPPORTED_SYMBOLS
+import metrics
+from response_cache import response_cache
+from scheduler import start_scheduler
+from serialization import RESPONSE_FORMATS, FastJSONProvider, serialize_frame
 
 
 app = Flask(__name__, template_folder="frontend", static_folder="frontend/static")
+app.json = FastJSONProvider(app)
+metrics.init_app(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+ensure_indexes()
 
-SUPPORTED_SYMBOLS = {
-    "AAPL": "Apple",
-    "MSFT": "Microsoft",
-    "GOOGL": "Alphabet",
-    "AMZN": "Amazon",
-    "TSLA": "Tesla",
-    "NVDA": "NVIDIA",
-    "META": "Meta",
-}
+if os.environ.get("PREFETCH_ENABLED") == "1":
+    # jeder Worker startet einen Scheduler, aber nur der Halter der Prefetch-Lease arbeitet
+    start_scheduler(SUPPORTED_SYMBOLS)
 
 MAX_PAST_DAYS = 365
 MAX_FUTURE_DAYS = 31
 MAX_NEWS_LOOKBACK = 30
+MAX_NEWS_PAGE = 500
+NEWS_FIELDS = ("full", "list")
+NEWS_FORMATS = ("json", "ndjson")
+
+STOCK_SOURCES = {"yahoo": "yfinance", "alpha_vantage": "alpha_vantage"}
+
+YF_COLUMNS = {"open": "open", "close": "close", "high": "high", "low": "low", "volume": "volume"}
+AV_COLUMNS = {
+    "open": "open",
+    "high": "high",
+    "low": "low",
+    "close": "close",
+    "adjusted_close": "adj_close",
+    "volume": "volume",
+}
 
 
 def _parse_date(value: str | None, field_name: str) -> date:
@@ -52,6 +89,27 @@ def _validate_range(start: date, end: date) -> None:
         raise ValueError("Zeitraum darf maximal einen Monat in die Zukunft reichen")
 
 
+def _parse_format(value: str | None) -> str:
+    response_format = (value or "rows").lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"Parameter 'format' muss einer von {', '.join(RESPONSE_FORMATS)} sein")
+    return response_format
+
+
+def _cached_response(key):
+    entry = response_cache.get(key)
+    if entry is None:
+        return None
+    if is_not_modified(entry.validator):
+        return not_modified_response(entry.validator)
+    return apply_cache_headers(Response(entry.body, mimetype="application/json"), entry.validator)
+
+
+def _store_response(key, tag, response, validator):
+    response_cache.put(key, response.get_data(), validator, tags=(tag,))
+    return apply_cache_headers(response, validator)
+
+
 @app.route("/")
 def index() -> str:
     return render_template("dashboard.html", symbols=SUPPORTED_SYMBOLS)
@@ -79,20 +137,82 @@ def news_endpoint():
             400,
         )
 
-    
+    limit = request.args.get("limit")
+    after_param = request.args.get("after")
+    fields = request.args.get("fields", "full")
+    response_format = request.args.get("format", "json")
+
+    try:
+        if fields not in NEWS_FIELDS:
+            raise ValueError(f"Parameter 'fields' muss einer von {', '.join(NEWS_FIELDS)} sein")
+        if response_format not in NEWS_FORMATS:
+            raise ValueError(f"Parameter 'format' muss einer von {', '.join(NEWS_FORMATS)} sein")
+        if limit is not None:
+            if not limit.isdigit() or not 1 <= int(limit) <= MAX_NEWS_PAGE:
+                raise ValueError(f"Parameter 'limit' muss zwischen 1 und {MAX_NEWS_PAGE} liegen")
+            limit = int(limit)
+        after = decode_news_cursor(after_param) if after_param else None
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    include_content = fields == "full"
+    paginated = limit is not None or after is not None or not include_content
+
+    cache_key = ("news", query, start_date.isoformat(), limit, after_param, fields, response_format)
+    if response_format == "json":
+        cached = _cached_response(cache_key)
+        if cached is not None:
+            return cached
+
     # kleine änderung an der alten Version : erst in der db prüfen 
     # Sie holt fehlende News, speichert sie und gibt alles aus der DB zurück
-    result = fetch_and_store_news_data(query, start_date.isoformat())
-    
-    # Payload für das Frontend zusammenbauen
-    articles = result.get("articles", [])
-    payload = {
-        "query": query,
-        "from": start_date.isoformat(),
-        "totalResults": result.get("totalResults", len(articles)),
-        "articles": articles,
-    }
-    return jsonify(payload)
+    # (Folgeseiten lesen nur noch aus der DB)
+    if after is None:
+        ensure_news_data(query, start_date.isoformat())
+
+    validator = build_validator(
+        cache_key,
+        news_data_state(query, start_date.isoformat()),
+        MAX_AGE_LIVE,
+    )
+    if validator is not None and is_not_modified(validator):
+        return not_modified_response(validator)
+
+    if response_format == "ndjson":
+        # ein Artikel pro Zeile, direkt aus dem Mongo-Cursor geschrieben
+        lines = (
+            app.json.dumps(article) + "\n"
+            for article in iter_news_articles(query, start_date.isoformat(), after, limit, include_content)
+        )
+        response = Response(lines, mimetype="application/x-ndjson")
+        return apply_cache_headers(response, validator) if validator is not None else response
+
+    if paginated:
+        page_size = limit or MAX_NEWS_PAGE
+        result = read_news_page(query, start_date.isoformat(), page_size, after, include_content)
+        payload = {
+            "query": query,
+            "from": start_date.isoformat(),
+            "limit": page_size,
+            "articles": result["articles"],
+            "next": result["next"],
+        }
+    else:
+        result = read_news_data(query, start_date.isoformat())
+
+        # Payload für das Frontend zusammenbauen
+        articles = result.get("articles", [])
+        payload = {
+            "query": query,
+            "from": start_date.isoformat(),
+            "totalResults": result.get("totalResults", len(articles)),
+            "articles": articles,
+        }
+
+    response = jsonify(payload)
+    if validator is None:
+        return response
+    return _store_response(cache_key, ("news", query), response, validator)
 
 
 @app.route("/api/stocks/yf")
@@ -108,32 +228,76 @@ def stocks_yfinance_endpoint():
         start_date = _parse_date(start_param, "start")
         end_date = _parse_date(end_param, "end")
         _validate_range(start_date, end_date)
+        response_format = _parse_format(request.args.get("format"))
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
 
+    cache_key = ("yf", symbol, start_date.isoformat(), end_date.isoformat(), response_format)
+    cached = _cached_response(cache_key)
+    if cached is not None:
+        return cached
+
     # genau wie bei news_data
-    frame = fetch_and_store_stock_data(symbol, start_date.isoformat(), end_date.isoformat(), source="yahoo")
+    ensure_stock_data(symbol, start_date.isoformat(), end_date.isoformat(), source="yahoo")
+
+    validator = build_validator(
+        cache_key,
+        stock_data_state(symbol, start_date, end_date, "yahoo"),
+        max_age_for(end_date),
+    )
+    if validator is None:
+        return jsonify({"error": "Kursdaten konnten nicht geladen werden"}), 502
+    if is_not_modified(validator):
+        return not_modified_response(validator)
+
+    frame = read_stock_frame(symbol, start_date, end_date, "yahoo")
     
     if frame is None or frame.empty:
         return jsonify({"error": "Kursdaten konnten nicht geladen werden"}), 502
 
-    records: List[Dict[str, Any]] = []
-    for _, row in frame.iterrows():
-        d_val = row["date"]
-        d_str = d_val.strftime("%Y-%m-%d") if isinstance(d_val, (date, datetime)) else str(d_val)
-        
-        records.append(
-            {
-                "date": d_str,
-                "open": float(row["open"]),
-                "close": float(row["close"]),
-                "high": float(row["high"]),
-                "low": float(row["low"]),
-                "volume": int(row["volume"]),
-            }
-        )
+    records = serialize_frame(frame, YF_COLUMNS, int_columns=("volume",), response_format=response_format)
+
+    response = jsonify({"symbol": symbol, "source": "yfinance", "data": records})
+    return _store_response(cache_key, ("stock", symbol, "yahoo"), response, validator)
+
+
+@app.route("/api/stocks/batch")
+def stocks_batch_endpoint():
+    symbols_param = request.args.get("symbols")
+    start_param = request.args.get("start")
+    end_param = request.args.get("end")
 
-    return jsonify({"symbol": symbol, "source": "yfinance", "data": records})
+    if symbols_param:
+        symbols = [s.strip().upper() for s in symbols_param.split(",") if s.strip()]
+    else:
+        symbols = list(SUPPORTED_SYMBOLS)
+
+    unsupported = [s for s in symbols if s not in SUPPORTED_SYMBOLS]
+    if unsupported:
+        return jsonify({"error": f"Ticker wird nicht unterstützt: {', '.join(unsupported)}"}), 400
+
+    try:
+        start_date = _parse_date(start_param, "start")
+        end_date = _parse_date(end_param, "end")
+        _validate_range(start_date, end_date)
+        response_format = _parse_format(request.args.get("format"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    frames = fetch_and_store_stock_data_many(symbols, start_date.isoformat(), end_date.isoformat(), source="yahoo")
+
+    data = {}
+    missing = []
+    for symbol, frame in frames.items():
+        if frame is None or frame.empty:
+            missing.append(symbol)
+            continue
+        data[symbol] = serialize_frame(frame, YF_COLUMNS, int_columns=("volume",), response_format=response_format)
+
+    if not data:
+        return jsonify({"error": "Kursdaten konnten nicht geladen werden"}), 502
+
+    return jsonify({"source": "yfinance", "data": data, "missing": missing})
 
 
 @app.route("/api/stocks/av")
@@ -149,36 +313,130 @@ def stocks_alpha_vantage_endpoint():
         start_date = _parse_date(start_param, "start")
         end_date = _parse_date(end_param, "end")
         _validate_range(start_date, end_date)
+        response_format = _parse_format(request.args.get("format"))
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
 
+    cache_key = ("av", symbol, start_date.isoformat(), end_date.isoformat(), response_format)
+    cached = _cached_response(cache_key)
+    if cached is not None:
+        return cached
+
     #  (Quelle: 'alpha_vantage') wird eher nicht genutzt wegen der Kosten 
-    frame = fetch_and_store_stock_data(symbol, start_date.isoformat(), end_date.isoformat(), source="alpha_vantage")
+    ensure_stock_data(symbol, start_date.isoformat(), end_date.isoformat(), source="alpha_vantage")
+
+    validator = build_validator(
+        cache_key,
+        stock_data_state(symbol, start_date, end_date, "alpha_vantage"),
+        max_age_for(end_date),
+    )
+    if validator is None:
+        return jsonify({"error": "Alpha Vantage Daten konnten nicht geladen werden"}), 502
+    if is_not_modified(validator):
+        return not_modified_response(validator)
+
+    frame = read_stock_frame(symbol, start_date, end_date, "alpha_vantage")
 
     if frame is None or frame.empty:
         return jsonify({"error": "Alpha Vantage Daten konnten nicht geladen werden"}), 502
 
-    data = []
-    for _, row in frame.iterrows():
-        d_val = row["date"]
-        d_str = d_val.strftime("%Y-%m-%d") if isinstance(d_val, (date, datetime)) else str(d_val)
-        
-        # 'adj_close' sicher behandeln (falls leer)
-        adj = row.get("adj_close")
-        if pd.isna(adj):
-            adj = 0.0
-
-        data.append({
-            "date": d_str,
-            "open": float(row["open"]),
-            "high": float(row["high"]),
-            "low": float(row["low"]),
-            "close": float(row["close"]),
-            "adjusted_close": float(adj),
-            "volume": int(row["volume"]),
-        })
-
-    return jsonify({"symbol": symbol, "source": "alpha_vantage", "data": data})
+    # 'adj_close' sicher behandeln (falls leer)
+    frame = frame.assign(adj_close=pd.to_numeric(frame["adj_close"], errors="coerce").fillna(0.0))
+    data = serialize_frame(frame, AV_COLUMNS, int_columns=("volume",), response_format=response_format)
+
+    response = jsonify({"symbol": symbol, "source": "alpha_vantage", "data": data})
+    return _store_response(cache_key, ("stock", symbol, "alpha_vantage"), response, validator)
+
+
+@app.route("/api/indicators")
+def indicators_endpoint():
+    symbol = request.args.get("symbol", "").upper()
+    source = request.args.get("source", "yahoo")
+
+    if symbol not in SUPPORTED_SYMBOLS:
+        return jsonify({"error": "Ticker wird nicht unterstützt"}), 400
+    if source not in STOCK_SOURCES:
+        return jsonify({"error": f"Parameter 'source' muss einer von {', '.join(STOCK_SOURCES)} sein"}), 400
+
+    try:
+        start_date = _parse_date(request.args.get("start"), "start")
+        end_date = _parse_date(request.args.get("end"), "end")
+        _validate_range(start_date, end_date)
+        names = parse_indicator_names(request.args.get("ind"))
+        response_format = _parse_format(request.args.get("format"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    frame = fetch_and_store_stock_data(symbol, start_date.isoformat(), end_date.isoformat(), source=source)
+
+    if frame is None or frame.empty:
+        return jsonify({"error": "Kursdaten konnten nicht geladen werden"}), 502
+
+    state = stock_data_state(symbol, start_date, end_date, source) or {}
+    result = cached_indicators(symbol, source, frame, names, start_date.isoformat(), end_date.isoformat(), state)
+    columns = {col: col for col in result.columns if col != "date"}
+    data = serialize_frame(result, columns, response_format=response_format)
+
+    return jsonify({"symbol": symbol, "source": STOCK_SOURCES[source], "indicators": names, "data": data})
+
+
+@app.route("/api/forecast")
+def forecast_endpoint():
+    symbol = request.args.get("symbol", "").upper()
+    source = request.args.get("source", "yahoo")
+    model = request.args.get("model", "linear").lower()
+
+    if symbol not in SUPPORTED_SYMBOLS:
+        return jsonify({"error": "Ticker wird nicht unterstützt"}), 400
+    if source not in STOCK_SOURCES:
+        return jsonify({"error": f"Parameter 'source' muss einer von {', '.join(STOCK_SOURCES)} sein"}), 400
+    if model not in MODELS:
+        return jsonify({"error": f"Parameter 'model' muss einer von {', '.join(MODELS)} sein"}), 400
+
+    try:
+        response_format = _parse_format(request.args.get("format"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    horizon = request.args.get("horizon", DEFAULT_HORIZON, type=int)
+    if horizon is None or not 1 <= horizon <= MAX_HORIZON:
+        return jsonify({"error": f"Parameter 'horizon' muss eine Zahl zwischen 1 und {MAX_HORIZON} sein"}), 400
+
+    # Prognose immer auf demselben Fenster, damit alle Clients dasselbe Ergebnis erhalten
+    today = date.today()
+    start_date = today - timedelta(days=LOOKBACK_DAYS)
+    frame = fetch_and_store_stock_data(symbol, start_date.isoformat(), today.isoformat(), source=source)
+
+    if frame is None or frame.empty:
+        return jsonify({"error": "Kursdaten konnten nicht geladen werden"}), 502
+
+    try:
+        state = stock_data_state(symbol, start_date, today, source) or {}
+        result = cached_forecast(symbol, source, frame, model, horizon, state)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 502
+
+    data = serialize_frame(
+        result, {"forecast": "forecast", "lower": "lower", "upper": "upper"}, response_format=response_format
+    )
+    return jsonify({
+        "symbol": symbol,
+        "source": STOCK_SOURCES[source],
+        "model": model,
+        "horizon": horizon,
+        "lastDate": pd.Timestamp(frame["date"].max()).strftime("%Y-%m-%d"),
+        "data": data,
+    })
+
+
+@app.route("/api/cache/stats")
+def cache_stats_endpoint():
+    return jsonify(response_cache.stats())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
 
 
 if __name__ == "__main__":
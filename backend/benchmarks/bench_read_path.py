@@ -0,0 +1,85 @@
+"""
+Vergleicht den Lesepfad über mongoengine-Dokumente mit dem Rohpfad (Projektion ->
+NumPy-Spalten) für 1k, 10k und 100k Tageskurse.
+
+Schreibt synthetische Kurse unter dem Ticker BENCH in die Datenbank BENCH_DB_NAME
+(Standard finanzanalyse_bench, muss auf "_bench" enden; DB_HOST/DB_PORT wie gewohnt)
+und löscht sie danach wieder. Ein geerbtes DB_NAME wird überschrieben.
+
+    python benchmarks/bench_read_path.py [ANZAHL ...]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# muss vor dem Import von database.py passieren, sonst trifft der Lauf die echte Datenbank
+_db_name = os.environ.get("BENCH_DB_NAME", "finanzanalyse_bench")
+if not _db_name.endswith("_bench"):
+    sys.exit(f"BENCH_DB_NAME={_db_name} endet nicht auf '_bench', Abbruch.")
+os.environ["DB_NAME"] = _db_name
+
+from database import stockDaten  # noqa: E402
+from storage import DocumentStore  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+REPEATS = int(os.environ.get("BENCH_REPEATS", 5))
+TICKER = "BENCH"
+SOURCE = "yahoo"
+FIRST_DAY = datetime(1900, 1, 1)
+
+
+def _seed(count: int) -> None:
+    rng = np.random.default_rng(42)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    docs = [
+        {
+            "ticker": TICKER, "source": SOURCE, "date": FIRST_DAY + timedelta(days=i),
+            "open": float(c), "high": float(c * 1.01), "low": float(c * 0.99), "close": float(c),
+            "adj_close": float(c), "volume": float(rng.integers(1_000, 1_000_000)),
+            "ingested_at": datetime.utcnow(),
+        }
+        for i, c in enumerate(close)
+    ]
+    collection = stockDaten._get_collection()
+    collection.delete_many({"ticker": TICKER})
+    for offset in range(0, len(docs), 10_000):
+        collection.insert_many(docs[offset:offset + 10_000], ordered=False)
+
+
+def _best_of(fn) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(sizes) -> None:
+    store = DocumentStore()
+    try:
+        for count in sizes:
+            _seed(count)
+            start = FIRST_DAY.date()
+            end = start + timedelta(days=count - 1)
+
+            raw_frame = store.read_frame(TICKER, start, end, SOURCE)
+            assert len(raw_frame) == count, f"{len(raw_frame)} statt {count} Zeilen gelesen"
+
+            documents = _best_of(lambda: store.read_frame(TICKER, start, end, SOURCE, raw=False))
+            raw = _best_of(lambda: store.read_frame(TICKER, start, end, SOURCE))
+            print(
+                f"{count:>7} Dokumente: mongoengine {documents * 1000:8.1f} ms, "
+                f"roh {raw * 1000:8.1f} ms, Faktor {documents / raw:4.1f}x"
+            )
+    finally:
+        stockDaten._get_collection().delete_many({"ticker": TICKER})
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or SIZES)
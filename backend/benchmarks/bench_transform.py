@@ -0,0 +1,87 @@
+"""
+Vergleicht die alte Aufbereitung (prepare_*_data + clean_stock_data) mit dem
+einstufigen Pfad (prepare_clean_*_data) über mehrere Ticker und Jahre.
+
+Gemessen werden Durchsatz (Zeilen/s), Spitzenspeicher während der Umwandlung
+(tracemalloc) und der Speicherbedarf des Ergebnisses. Braucht keine Datenbank.
+
+    python benchmarks/bench_transform.py [--tickers 50] [--years 10] [--float-dtype float32]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+from DatenBearbeiten import (  # noqa: E402
+    clean_stock_data, prepare_alpha_data, prepare_clean_alpha_data, prepare_clean_yahoo_data, prepare_yahoo_data,
+)
+
+REPEATS = int(os.environ.get("BENCH_REPEATS", 3))
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _measure(transform, inputs):
+    """(beste Laufzeit in s, Spitzenspeicher einer Umwandlung, Speicher aller Ergebnisse, Zeilen)."""
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for raw in inputs:
+            transform(raw)
+        timings.append(time.perf_counter() - started)
+
+    # Speicher separat messen (tracemalloc bremst); Spitze pro Umwandlung ohne die gehaltenen Ergebnisse
+    tracemalloc.start()
+    frames, peak = [], 0
+    for raw in inputs:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        frames.append(transform(raw))
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    result_bytes = sum(int(frame.memory_usage(deep=True).sum()) for frame in frames)
+    return min(timings), peak, result_bytes, sum(len(frame) for frame in frames)
+
+
+def _report(name, old, new):
+    (old_s, old_peak, old_bytes, rows), (new_s, new_peak, new_bytes, new_rows) = old, new
+    assert rows == new_rows, f"{name}: {rows} gegen {new_rows} Zeilen"
+    mb = 1024 * 1024
+    print(f"{name} ({rows} Zeilen)")
+    print(f"  {'':<10} {'Zeilen/s':>12} {'Spitze MB':>10} {'Ergebnis MB':>12}")
+    print(f"  {'alt':<10} {rows / old_s:>12,.0f} {old_peak / mb:>10.2f} {old_bytes / mb:>12.1f}")
+    print(f"  {'einstufig':<10} {rows / new_s:>12,.0f} {new_peak / mb:>10.2f} {new_bytes / mb:>12.1f}")
+    print(f"  Faktor {old_s / new_s:.1f}x schneller, {old_peak / new_peak:.1f}x weniger Spitzenspeicher")
+
+
+def run(tickers: int, years: int, float_dtype: str) -> None:
+    days = years * TRADING_DAYS_PER_YEAR
+    names = [f"T{i:03d}" for i in range(tickers)]
+    print(f"{tickers} Ticker x {years} Jahre, Kurse als {float_dtype}")
+
+    yahoo = [(fixtures.yahoo_history(name, days), name) for name in names]
+    _report(
+        "yahoo",
+        _measure(lambda item: clean_stock_data(prepare_yahoo_data(item[0], item[1])), yahoo),
+        _measure(lambda item: prepare_clean_yahoo_data(item[0], item[1], float_dtype=float_dtype), yahoo),
+    )
+    del yahoo
+
+    alpha = [(fixtures.alpha_daily(name, days), name) for name in names]
+    _report(
+        "alpha_vantage",
+        _measure(lambda item: clean_stock_data(prepare_alpha_data(item[0], item[1])), alpha),
+        _measure(lambda item: prepare_clean_alpha_data(item[0], item[1], float_dtype=float_dtype), alpha),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speicher und Durchsatz der Kursaufbereitung")
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--float-dtype", default="float64", choices=["float64", "float32"])
+    args = parser.parse_args()
+    run(args.tickers, args.years, args.float_dtype)
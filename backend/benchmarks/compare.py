@@ -0,0 +1,68 @@
+"""
+Vergleicht zwei Ergebnisdateien von run_benchmarks.py (z.B. main gegen Feature-Branch).
+
+Ein Fall gilt als Regression, wenn sein p50 um mehr als --threshold (Standard 15 %)
+langsamer ist. Der Exit-Code ist dann 1, damit sich das Skript in CI verwenden lässt.
+
+    python benchmarks/compare.py ALT.json NEU.json [--threshold 0.15] [--metric p50_ms]
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base: dict, head: dict, metric: str, threshold: float) -> list:
+    """Liefert (Fall, alt, neu, relative Änderung, Regression) für alle gemeinsamen Fälle."""
+    rows = []
+    for name, head_result in head["results"].items():
+        base_result = base["results"].get(name)
+        if base_result is None:
+            continue
+        old, new = base_result[metric], head_result[metric]
+        change = (new - old) / old if old else 0.0
+        rows.append((name, old, new, change, change > threshold))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark-Ergebnisse zweier Commits vergleichen")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p99_ms", "mean_ms"])
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    if base["meta"].get("database") != head["meta"].get("database"):
+        print(
+            f"Warnung: unterschiedliche Datenbanken ({base['meta'].get('database')} / "
+            f"{head['meta'].get('database')}), die Werte sind nur bedingt vergleichbar."
+        )
+
+    rows = compare(base, head, args.metric, args.threshold)
+    print(f"{base['meta']['commit']} -> {head['meta']['commit']} ({args.metric})")
+    print(f"{'Fall':<30} {'alt':>10} {'neu':>10} {'Änderung':>10}")
+    for name, old, new, change, regression in rows:
+        marker = "  REGRESSION" if regression else ""
+        print(f"{name:<30} {old:>10.2f} {new:>10.2f} {change:>+9.1%}{marker}")
+
+    only_base = sorted(set(base["results"]) - set(head["results"]))
+    only_head = sorted(set(head["results"]) - set(base["results"]))
+    if only_base:
+        print(f"Nur in {args.base}: {', '.join(only_base)}")
+    if only_head:
+        print(f"Nur in {args.head}: {', '.join(only_head)}")
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} Regression(en) über {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Feste Testdaten im Format der Anbieter (yfinance, Alpha Vantage, NewsAPI, Gemini).
+
+Alles wird aus einem festen Seed erzeugt und relativ zum heutigen Tag verankert,
+damit die Endpunkte (maximal ein Jahr zurück) immer vollständige Daten sehen und
+jeder Lauf mit denselben Eingaben rechnet.
+"""
+import json
+import re
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+SEED = 20240101
+HISTORY_DAYS = 400
+
+
+def _rng(name: str) -> np.random.Generator:
+    return np.random.default_rng([SEED, sum(map(ord, name))])
+
+
+def yahoo_history(ticker: str, days: int = HISTORY_DAYS) -> pd.DataFrame:
+    """Wie ``yf.Ticker(t).history()``: Index 'Date' in New Yorker Zeit, Spalten in Großschreibung."""
+    rng = _rng(ticker)
+    index = pd.bdate_range(end=date.today(), periods=days, tz="America/New_York", name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, len(index))))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, len(index))),
+        "High": close * (1 + np.abs(rng.normal(0, 0.01, len(index)))),
+        "Low": close * (1 - np.abs(rng.normal(0, 0.01, len(index)))),
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 50_000_000, len(index)),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=index)
+
+
+def alpha_daily(ticker: str, days: int = HISTORY_DAYS) -> dict:
+    """Wie ``get_stock_data_alpha_vantage``: {"YYYY-MM-DD": {"1. open": ..., ...}}."""
+    history = yahoo_history(ticker, days)
+    return {
+        ts.strftime("%Y-%m-%d"): {
+            "1. open": row.Open, "2. high": row.High, "3. low": row.Low,
+            "4. close": row.Close, "5. volume": float(row.Volume),
+        }
+        for ts, row in history.iterrows()
+    }
+
+
+def news_response(query: str, from_date: str, per_day: int = 20) -> dict:
+    """Wie die NewsAPI-Antwort von /v2/everything."""
+    rng = _rng(query)
+    start = date.fromisoformat(from_date)
+    articles = []
+    for day in range((date.today() - start).days + 1):
+        current = start + timedelta(days=day)
+        for i in range(per_day):
+            hour = int(rng.integers(0, 24))
+            articles.append({
+                "source": {"id": None, "name": f"Quelle {i % 7}"},
+                "author": f"Autor {i % 11}",
+                "title": f"{query}: Meldung {current.isoformat()} #{i}",
+                "description": f"Kurzbeschreibung zu {query}, Tag {day}, Nummer {i}. " * 3,
+                "url": f"https://example.org/{query}/{current.isoformat()}/{i}",
+                "urlToImage": None,
+                "publishedAt": f"{current.isoformat()}T{hour:02d}:00:00Z",
+                "content": f"Volltext der Meldung {i} zu {query}. " * 20,
+            })
+    return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+
+class GeminiStub:
+    """Ersatz für ``genai.Client``: bewertet jede [id] im Prompt mit einem festen Score."""
+
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self):
+        self.models = self
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        ids = [int(i) for i in re.findall(r"^\s*\[(\d+)\]", contents, flags=re.MULTILINE)]
+        if not ids:
+            return self._Response("+5")
+        return self._Response(json.dumps([{"id": i, "bewertung": f"+{(i % 9) + 1}"} for i in ids]))
@@ -0,0 +1,360 @@
+"""
+Offline-Benchmarks für Aufbereitung, Speichern, Abfragen, Serialisierung und Endpunkte.
+
+Läuft ohne Netzwerk: yfinance, Alpha Vantage, NewsAPI und Gemini werden durch die
+Daten aus fixtures.py ersetzt. Standardmäßig mit mongomock (DB_MOCK=1), mit --mongo
+gegen einen lokalen mongod (DB_HOST/DB_PORT). Die Datenbank ist immer BENCH_DB_NAME
+(Standard finanzanalyse_bench) und muss auf "_bench" enden; ein geerbtes DB_NAME wird
+überschrieben, damit ein Lauf nie die echte Datenbank trifft.
+
+Pro Fall werden p50/p99 und Durchsatz gemessen und als JSON unter benchmarks/results/
+abgelegt; compare.py vergleicht zwei solche Dateien.
+
+    python benchmarks/run_benchmarks.py [--mongo] [--repeats N] [--only NAME ...] [--output DATEI]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+sys.path.insert(0, BACKEND_DIR)
+
+
+BENCH_TICKER = "BENCH"
+BENCH_QUERY = "AAPL"
+
+
+def _configure_environment(use_mongo: bool) -> None:
+    # muss vor dem Import von database.py passieren
+    db_name = os.environ.get("BENCH_DB_NAME", "finanzanalyse_bench")
+    if not db_name.endswith("_bench"):
+        sys.exit(f"BENCH_DB_NAME={db_name} endet nicht auf '_bench', Abbruch.")
+    os.environ["DB_NAME"] = db_name
+    if not use_mongo:
+        os.environ["DB_MOCK"] = "1"
+    os.environ["PREFETCH_ENABLED"] = "0"
+    os.environ.setdefault("GEMINI_API_KEY", "offline")   # der Client wird durch GeminiStub ersetzt
+    os.environ.setdefault("COLUMNAR_CACHE_DIR", tempfile.mkdtemp(prefix="bench_columnar_"))
+    for provider in ("NEWSAPI", "ALPHA_VANTAGE", "GEMINI"):
+        os.environ.setdefault(f"QUOTA_{provider}_PER_MINUTE", "1000000")
+        os.environ.setdefault(f"QUOTA_{provider}_BURST", "1000000")
+        os.environ.setdefault(f"QUOTA_{provider}_DAILY", "100000000")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unbekannt"
+
+
+def measure(fn, items: int, repeats: int, setup=None, warmup: int = 1) -> dict:
+    """Führt fn wiederholt aus; setup() läuft vor jedem Durchgang und wird nicht gemessen."""
+    timings = []
+    for i in range(warmup + repeats):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+
+    timings = np.array(timings)
+    return {
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p99_ms": float(np.percentile(timings, 99) * 1000),
+        "mean_ms": float(timings.mean() * 1000),
+        "items": items,
+        "throughput_per_s": float(items / timings.mean()) if timings.mean() > 0 else None,
+        "repeats": repeats,
+    }
+
+
+class Suite:
+    def __init__(self, repeats: int):
+        self.repeats = repeats
+        self.cases = {}
+        self.cleanup = lambda: None
+
+    def case(self, name: str):
+        def register(fn):
+            self.cases[name] = fn
+            return fn
+        return register
+
+
+def build_suite(repeats: int) -> Suite:
+    import fixtures
+    import columnar_cache
+    import forecast
+    import indicators
+    import providers
+    import save_data
+    from app import app
+    from constants import SUPPORTED_SYMBOLS
+    from database import news_Daten, sentimentCache, stockBucket, stockCoverage, stockDaten
+    from DatenBearbeiten import (
+        clean_stock_data, prepare_alpha_data, prepare_clean_alpha_data, prepare_clean_yahoo_data,
+        prepare_news_data, prepare_yahoo_data,
+    )
+    from response_cache import response_cache
+    from serialization import serialize_frame
+    from storage import BucketStore, DocumentStore
+
+    # Anbieter durch feste Daten ersetzen
+    def fake_yahoo(ticker, start, end):
+        history = fixtures.yahoo_history(ticker)
+        mask = (history.index.date >= date.fromisoformat(start)) & (history.index.date < date.fromisoformat(end))
+        return history[mask]
+
+    def fake_alpha(ticker, start, end):
+        return {d: row for d, row in fixtures.alpha_daily(ticker).items() if start <= d <= end}
+
+    providers.get_stock_data_yfinance = fake_yahoo
+    providers.get_stock_data_alpha_vantage = fake_alpha
+    save_data.get_news_from_news_api = lambda query, from_date, *args, **kwargs: fixtures.news_response(query, from_date)
+
+    suite = Suite(repeats)
+    client = app.test_client()
+    today = date.today()
+    year_start = (today - timedelta(days=364)).isoformat()
+    news_from = (today - timedelta(days=7)).isoformat()
+
+    history = fixtures.yahoo_history("AAPL")
+    alpha_raw = fixtures.alpha_daily("AAPL")
+    news_raw = fixtures.news_response(BENCH_QUERY, news_from)
+    prepared = clean_stock_data(prepare_yahoo_data(history, BENCH_TICKER))
+    rows = len(prepared)
+
+    def reset_stock(ticker=BENCH_TICKER):
+        stockDaten._get_collection().delete_many({"ticker": ticker})
+
+    def reset_caches():
+        response_cache.clear()
+        indicators._cache.clear()
+        forecast._cache.clear()
+
+    # --- Aufbereitung (DatenBearbeiten) ---
+    @suite.case("prepare_yahoo")
+    def _():
+        return measure(lambda: prepare_yahoo_data(history, "AAPL"), len(history), repeats)
+
+    @suite.case("clean_stock")
+    def _():
+        return measure(lambda: clean_stock_data(prepared), rows, repeats)
+
+    @suite.case("prepare_alpha")
+    def _():
+        return measure(lambda: prepare_alpha_data(alpha_raw, "AAPL"), len(alpha_raw), repeats)
+
+    @suite.case("prepare_clean_yahoo")
+    def _():
+        return measure(lambda: prepare_clean_yahoo_data(history, "AAPL"), len(history), repeats)
+
+    @suite.case("prepare_clean_alpha")
+    def _():
+        return measure(lambda: prepare_clean_alpha_data(alpha_raw, "AAPL"), len(alpha_raw), repeats)
+
+    @suite.case("prepare_news")
+    def _():
+        return measure(lambda: prepare_news_data(news_raw, "AAPL"), len(news_raw["articles"]), repeats)
+
+    # --- Speichern ---
+    @suite.case("save_bulk")
+    def _():
+        return measure(lambda: DocumentStore().save_frame(prepared), rows, repeats, setup=reset_stock)
+
+    @suite.case("save_per_row")
+    def _():
+        return measure(lambda: save_data._save_stock_frame_per_row(prepared), rows, repeats, setup=reset_stock)
+
+    @suite.case("save_bucket")
+    def _():
+        from database import stockBucket
+        return measure(
+            lambda: BucketStore().save_frame(prepared), rows, repeats,
+            setup=lambda: stockBucket._get_collection().delete_many({"ticker": BENCH_TICKER}),
+        )
+
+    # --- Bereichsabfragen (ein Jahr) ---
+    def read_case(read, store):
+        reset_stock()
+        store.save_frame(prepared)
+        first = prepared["date"].min().date()
+        end = prepared["date"].max().date()
+        return measure(lambda: read(first, end), rows, repeats)
+
+    @suite.case("read_documents")
+    def _():
+        store = DocumentStore()
+        return read_case(lambda s, e: store.read_frame(BENCH_TICKER, s, e, "yahoo", raw=False), store)
+
+    @suite.case("read_raw")
+    def _():
+        store = DocumentStore()
+        return read_case(lambda s, e: store.read_frame(BENCH_TICKER, s, e, "yahoo"), store)
+
+    @suite.case("read_bucket")
+    def _():
+        store = BucketStore()
+        return read_case(lambda s, e: store.read_frame(BENCH_TICKER, s, e, "yahoo"), store)
+
+    # --- Serialisierung ---
+    frame = DocumentStore().read_frame(BENCH_TICKER, prepared["date"].min().date(), today, "yahoo")
+    if frame is None:
+        DocumentStore().save_frame(prepared)
+        frame = DocumentStore().read_frame(BENCH_TICKER, prepared["date"].min().date(), today, "yahoo")
+    columns = {"open": "open", "high": "high", "low": "low", "close": "close", "volume": "volume"}
+
+    for response_format in ("rows", "columnar"):
+        @suite.case(f"serialize_{response_format}")
+        def _(response_format=response_format):
+            def run():
+                with app.app_context():
+                    app.json.dumps(serialize_frame(frame, columns, ("volume",), response_format))
+            return measure(run, len(frame), repeats)
+
+    # --- Endpunkte über den Test-Client (Daten liegen in der DB, Antwortcache leer) ---
+    def endpoint_case(url: str, items: int, warm: bool = False):
+        response = client.get(url)   # erster Aufruf füllt die DB aus den Fixtures
+        assert response.status_code == 200, f"{url}: {response.status_code} {response.get_data(as_text=True)[:200]}"
+
+        def run():
+            result = client.get(url)
+            assert result.status_code == 200
+        return measure(run, items, repeats, setup=None if warm else reset_caches)
+
+    stock_url = f"/api/stocks/yf?symbol=AAPL&start={year_start}&end={today.isoformat()}"
+    trading_days = int(np.busday_count(year_start, today + timedelta(days=1)))
+
+    @suite.case("endpoint_stocks_yf")
+    def _():
+        return endpoint_case(stock_url, trading_days)
+
+    @suite.case("endpoint_stocks_yf_columnar")
+    def _():
+        return endpoint_case(stock_url + "&format=columnar", trading_days)
+
+    @suite.case("endpoint_stocks_yf_cached")
+    def _():
+        return endpoint_case(stock_url, trading_days, warm=True)
+
+    @suite.case("endpoint_stocks_av")
+    def _():
+        return endpoint_case(f"/api/stocks/av?symbol=AAPL&start={year_start}&end={today.isoformat()}", trading_days)
+
+    @suite.case("endpoint_stocks_batch")
+    def _():
+        return endpoint_case(f"/api/stocks/batch?start={year_start}&end={today.isoformat()}", trading_days * 7)
+
+    @suite.case("endpoint_indicators")
+    def _():
+        return endpoint_case(
+            f"/api/indicators?symbol=AAPL&start={year_start}&end={today.isoformat()}&ind=sma,ema,rsi,macd,bollinger",
+            trading_days,
+        )
+
+    @suite.case("endpoint_forecast")
+    def _():
+        return endpoint_case("/api/forecast?symbol=AAPL&model=ets", 1)
+
+    @suite.case("endpoint_news")
+    def _():
+        return endpoint_case(f"/api/news?query={BENCH_QUERY}&from={news_from}", len(news_raw["articles"]))
+
+    @suite.case("endpoint_news_page")
+    def _():
+        return endpoint_case(f"/api/news?query={BENCH_QUERY}&from={news_from}&limit=10&fields=list", 10)
+
+    # --- Sentiment (Gemini-Stub, Cache vor jedem Durchgang geleert) ---
+    @suite.case("sentiment_batch")
+    def _():
+        import analysis
+
+        analysis.client = fixtures.GeminiStub()
+        articles = news_raw["articles"][:200]
+        return measure(
+            lambda: analysis.analyze_news_batch(articles, BENCH_QUERY), len(articles), repeats,
+            setup=lambda: sentimentCache._get_collection().delete_many({"topic": BENCH_QUERY}),
+        )
+
+    def cleanup():
+        # nur die vom Benchmark angelegten Dokumente und das temporäre Cache-Verzeichnis löschen
+        tickers = {"ticker": {"$in": [BENCH_TICKER, *SUPPORTED_SYMBOLS]}}
+        for collection in (stockDaten, stockBucket, stockCoverage):
+            collection._get_collection().delete_many(tickers)
+        news_Daten._get_collection().delete_many({"query": BENCH_QUERY})
+        sentimentCache._get_collection().delete_many({"topic": BENCH_QUERY})
+        if os.path.basename(columnar_cache.CACHE_DIR).startswith("bench_columnar_"):
+            shutil.rmtree(columnar_cache.CACHE_DIR, ignore_errors=True)
+
+    suite.cleanup = cleanup
+    return suite
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline-Benchmarks für das Backend")
+    parser.add_argument("--mongo", action="store_true", help="lokalen mongod statt mongomock verwenden")
+    parser.add_argument("--repeats", type=int, default=int(os.environ.get("BENCH_REPEATS", 20)))
+    parser.add_argument("--only", nargs="*", help="nur diese Fälle ausführen")
+    parser.add_argument("--output", help="Ergebnisdatei (Standard: benchmarks/results/<zeit>-<commit>.json)")
+    args = parser.parse_args()
+
+    _configure_environment(args.mongo)
+    suite = build_suite(args.repeats)
+
+    names = args.only or list(suite.cases)
+    unknown = [name for name in names if name not in suite.cases]
+    if unknown:
+        parser.error(f"unbekannte Fälle: {', '.join(unknown)} (verfügbar: {', '.join(suite.cases)})")
+
+    results = {}
+    print(f"{'Fall':<30} {'p50 ms':>10} {'p99 ms':>10} {'Einheiten/s':>14}")
+    try:
+        for name in names:
+            try:
+                results[name] = suite.cases[name]()
+            except Exception as e:
+                # ein fehlerhafter Fall soll die übrigen nicht verhindern
+                print(f"{name:<30} Fehler: {e}")
+                continue
+            r = results[name]
+            throughput = f"{r['throughput_per_s']:,.0f}" if r["throughput_per_s"] else "-"
+            print(f"{name:<30} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {throughput:>14}")
+    finally:
+        suite.cleanup()
+
+    commit = _git_commit()
+    payload = {
+        "meta": {
+            "commit": commit,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongod" if args.mongo else "mongomock",
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Ergebnisse gespeichert: {output}")
+
+
+if __name__ == "__main__":
+    main()
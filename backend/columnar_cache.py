@@ -0,0 +1,147 @@
+"""
+Lokaler Spalten-Cache für abgeschlossene Tageskurse.
+
+Pro (ticker, source) eine Arrow-IPC-Datei mit den Kursen eines lückenlos abgedeckten
+Zeitraums. Gelesen wird per Memory-Map, Bereichsabfragen schneiden die Tabelle ohne
+Kopie zu. MongoDB bleibt die maßgebliche Quelle; die Datei wird aus MongoDB neu
+geschrieben und gelöscht, sobald ein Schreibvorgang ihren Zeitraum berührt.
+"""
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from metrics import count_cache
+
+try:  # optional: ohne pyarrow wird direkt aus MongoDB gelesen
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover
+    pa = None
+
+CACHE_DIR = os.environ.get(
+    "COLUMNAR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "columnar")
+)
+ENABLED = pa is not None and os.environ.get("COLUMNAR_CACHE", "1") != "0"
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume", "adj_close"]
+
+_lock = threading.Lock()
+_generations = {}   # {(ticker, source): Zähler}, steigt bei jeder Invalidierung
+
+
+def _path(ticker: str, source: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in f"{source}_{ticker}")
+    return os.path.join(CACHE_DIR, f"{safe}.arrow")
+
+
+def _open(ticker: str, source: str):
+    """Liefert (Tabelle, erster Tag, letzter Tag) oder None, wenn keine Datei existiert."""
+    try:
+        source_file = pa.memory_map(_path(ticker, source), "r")
+        table = ipc.open_file(source_file).read_all()
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    meta = table.schema.metadata or {}
+    try:
+        first = date.fromisoformat(meta[b"covered_start"].decode())
+        last = date.fromisoformat(meta[b"covered_end"].decode())
+    except (KeyError, ValueError):
+        return None
+    return table, first, last
+
+
+def covered_range(ticker: str, source: str):
+    if not ENABLED:
+        return None
+    opened = _open(ticker, source)
+    return None if opened is None else opened[1:]
+
+
+def read(ticker: str, source: str, req_start: date, req_end: date):
+    """Kurse aus dem Cache, falls die Datei [req_start, req_end] vollständig abdeckt, sonst None."""
+    if not ENABLED:
+        return None
+    opened = _open(ticker, source)
+    if opened is None or req_start < opened[1] or req_end > opened[2]:
+        count_cache("columnar", False)
+        return None
+    table = opened[0]
+    count_cache("columnar", True)
+
+    # Yahoo-Kurse liegen nicht auf Mitternacht UTC, daher exklusiv bis zum Folgetag
+    dates = table.column("date").to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(req_start), side="left")
+    hi = np.searchsorted(dates, np.datetime64(req_end + timedelta(days=1)), side="left")
+
+    # slice() kopiert nicht, split_blocks vermeidet das Zusammenlegen der Spalten
+    frame = table.slice(lo, hi - lo).to_pandas(split_blocks=True)
+    return frame.assign(ticker=ticker, source=source)
+
+
+def generation(ticker: str, source: str) -> int:
+    return _generations.get((ticker, source), 0)
+
+
+def write(ticker: str, source: str, frame, covered_start: date, covered_end: date,
+          expected_generation: int | None = None) -> None:
+    """Ersetzt die Datei atomar durch die Kurse des Zeitraums [covered_start, covered_end].
+
+    Mit expected_generation wird nicht geschrieben, wenn dieser Prozess seit dem Lesen
+    aus MongoDB neue Kurse gespeichert hat. Gegen Schreibvorgänge anderer Prozesse
+    schützt der Aufrufer, indem er nur für einen vor dem Lesen geladenen, vollständigen
+    Abdeckungsstand schreibt.
+    """
+    if not ENABLED:
+        return
+    if frame is None or frame.empty:
+        frame = pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]")})
+
+    data = {"date": pd.to_datetime(frame["date"]).to_numpy(dtype="datetime64[ns]")}
+    for col in PRICE_COLUMNS:
+        values = frame[col] if col in frame.columns else pd.Series(np.nan, index=frame.index)
+        data[col] = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64")
+
+    order = np.argsort(data["date"], kind="stable")
+    table = pa.table({name: values[order] for name, values in data.items()})
+    table = table.replace_schema_metadata({
+        "covered_start": covered_start.isoformat(),
+        "covered_end": covered_end.isoformat(),
+    })
+
+    with _lock:
+        if expected_generation is not None and generation(ticker, source) != expected_generation:
+            return
+        _write_table(ticker, source, table)
+
+
+def _write_table(ticker: str, source: str, table) -> None:
+    path = _path(ticker, source)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Spalten-Cache für {source}/{ticker} konnte nicht geschrieben werden: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def invalidate(ticker: str, source: str, first_written: datetime, last_written: datetime) -> None:
+    """Löscht die Datei, wenn neu geschriebene Tage in ihren Zeitraum fallen."""
+    if not ENABLED:
+        return
+    with _lock:
+        _generations[(ticker, source)] = generation(ticker, source) + 1
+        covered = covered_range(ticker, source)
+        if covered is None:
+            return
+        if first_written.date() <= covered[1] and last_written.date() >= covered[0]:
+            try:
+                os.remove(_path(ticker, source))
+            except FileNotFoundError:
+                pass
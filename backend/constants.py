@@ -0,0 +1,11 @@
+"""Gemeinsame Konstanten für app.py und den eigenständigen Prefetch (scheduler.py)."""
+
+SUPPORTED_SYMBOLS = {
+    "AAPL": "Apple",
+    "MSFT": "Microsoft",
+    "GOOGL": "Alphabet",
+    "AMZN": "Amazon",
+    "TSLA": "Tesla",
+    "NVDA": "NVIDIA",
+    "META": "Meta",
+}
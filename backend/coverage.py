@@ -0,0 +1,128 @@
+"""Handelskalender und Manifest der bereits abgefragten Zeiträume pro (ticker, source)."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    GoodFriday,
+    Holiday,
+    USLaborDay,
+    USMartinLutherKingJr,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+from pandas.tseries.offsets import CustomBusinessDay
+
+from database import stockCoverage
+
+Interval = Tuple[date, date]
+
+
+class NyseHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("NewYearsDay", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("USIndependenceDay", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+TRADING_DAY = CustomBusinessDay(calendar=NyseHolidayCalendar())
+
+MARKET_TZ = ZoneInfo("America/New_York")
+# Tageskurse gelten etwas nach Börsenschluss (16:00 New York) als endgültig
+SESSION_SETTLED = time(16, 30)
+
+
+def trading_days(start: date, end: date) -> pd.DatetimeIndex:
+    return pd.date_range(start, end, freq=TRADING_DAY)
+
+
+def trim_to_trading_days(start: date, end: date) -> Optional[Interval]:
+    """Schneidet Wochenenden/Feiertage an den Rändern ab; None, wenn kein Handelstag enthalten ist."""
+    days = trading_days(start, end)
+    if days.empty:
+        return None
+    return days[0].date(), days[-1].date()
+
+
+def is_trading_day(day: date) -> bool:
+    return not trading_days(day, day).empty
+
+
+def last_settled_day() -> date:
+    # der heutige Kurs ist erst nach Börsenschluss endgültig
+    now = datetime.now(MARKET_TZ)
+    if now.time() >= SESSION_SETTLED and is_trading_day(now.date()):
+        return now.date()
+    return now.date() - timedelta(days=1)
+
+
+def next_session_settled(now: Optional[datetime] = None) -> datetime:
+    """Nächster Zeitpunkt (in MARKET_TZ), zu dem ein neuer Tageskurs endgültig ist."""
+    now = now or datetime.now(MARKET_TZ)
+    day = now.date()
+    if not is_trading_day(day) or now.time() >= SESSION_SETTLED:
+        day = (pd.Timestamp(day) + TRADING_DAY).date()
+    return datetime.combine(day, SESSION_SETTLED, tzinfo=MARKET_TZ)
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_intervals(covered: List[Interval], start: date, end: date) -> List[Interval]:
+    """Teilintervalle von [start, end], die noch nicht in ``covered`` enthalten sind."""
+    gaps: List[Interval] = []
+    cursor = start
+    for c_start, c_end in merge_intervals(covered):
+        if c_end < cursor:
+            continue
+        if c_start > end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, c_start - timedelta(days=1)))
+        cursor = c_end + timedelta(days=1)
+        if cursor > end:
+            return gaps
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def load_coverage(ticker: str, source: str) -> List[Interval]:
+    manifest = stockCoverage.objects(ticker=ticker, source=source).first()
+    if manifest is None:
+        return []
+    return [(s.date(), e.date()) for s, e in manifest.intervals]
+
+
+def add_coverage(ticker: str, source: str, start: date, end: date) -> None:
+    intervals = merge_intervals(load_coverage(ticker, source) + [(start, end)])
+    stockCoverage.objects(ticker=ticker, source=source).update_one(
+        set__intervals=[
+            [datetime.combine(s, datetime.min.time()), datetime.combine(e, datetime.min.time())]
+            for s, e in intervals
+        ],
+        upsert=True,
+    )
@@ -1,21 +1,209 @@
 import os
-from mongoengine import connect, StringField, DateTimeField, DynamicDocument
+from datetime import datetime, timedelta
+
+from metrics import install_mongo_listener
+from mongoengine import (
+    connect, StringField, DateTimeField, FloatField, IntField, ListField, Document, DynamicDocument
+)
 
 mongo_host = os.environ.get('DB_HOST', 'localhost')
 mongo_port = int(os.environ.get('DB_PORT', 27018))
+mongo_db = os.environ.get('DB_NAME', 'finanzanalyse')
 
 print(f"Verbinde mit MongoDB unter: {mongo_host}:{mongo_port}")
 
-connect(db='finanzanalyse', host=mongo_host, port=mongo_port)
+# vor connect(), damit der MongoClient die Befehle an /metrics meldet
+install_mongo_listener()
+
+if os.environ.get('DB_MOCK') == '1':
+    # In-Memory-Ersatz für Offline-Benchmarks (benchmarks/requirements-bench.txt)
+    import mongomock
+    print("DB_MOCK=1: verwende mongomock statt MongoDB")
+    connect(db=mongo_db, host=mongo_host, port=mongo_port, mongo_client_class=mongomock.MongoClient)
+else:
+    connect(db=mongo_db, host=mongo_host, port=mongo_port)
 
 class stockDaten(DynamicDocument):   # Yahoo finanz und Alpha Vantage
     date = DateTimeField(required=True)
     ticker = StringField(required=True)
     source = StringField(required=True)
 
+    meta = {
+        "auto_create_index": False,  # wird beim Start über ensure_indexes() angelegt
+        "indexes": [
+            # Upsert-Key der Bulk-Ingestion und Grundlage aller Bereichsabfragen
+            {"fields": ["ticker", "source", "date"], "unique": True, "name": "ticker_source_date"},
+        ],
+    }
+
+class stockBucket(Document):   # alternatives Layout: ein Dokument pro (ticker, source, Monat)
+    ticker = StringField(required=True)
+    source = StringField(required=True)
+    month = DateTimeField(required=True)   # erster Tag des Monats (UTC)
+    dates = ListField(DateTimeField())     # aufsteigend, parallel zu den Kursspalten
+    open = ListField(FloatField())
+    high = ListField(FloatField())
+    low = ListField(FloatField())
+    close = ListField(FloatField())
+    adj_close = ListField(FloatField())
+    volume = ListField(FloatField())
+    provider = ListField(StringField())    # tatsächlicher Anbieter pro Tag (siehe providers.py)
+    count = IntField(default=0)
+    last_date = DateTimeField()
+    ingested_at = DateTimeField()
+    version = IntField(default=0)          # optimistische Sperre für das Zusammenführen
+
+    meta = {
+        "auto_create_index": False,
+        "indexes": [
+            {"fields": ["ticker", "source", "month"], "unique": True, "name": "ticker_source_month"},
+        ],
+    }
+
 class news_Daten(DynamicDocument):   # news API collection
     date = DateTimeField(required=True)
     title = StringField(required=True)
     source = StringField(required=True)
     query = StringField() 
-    
\ No newline at end of file
+
+    meta = {
+        "auto_create_index": False,
+        "indexes": [
+            # _id als Tie-Breaker für die Keyset-Pagination von /api/news
+            {"fields": ["query", "date", "_id"], "name": "query_date_id"},
+            # Deduplizierung der Artikel pro Suchbegriff
+            {"fields": ["query", "title"], "unique": True, "name": "query_title"},
+        ],
+    }
+
+class stockCoverage(Document):   # bereits abgefragte Zeiträume pro (ticker, source)
+    ticker = StringField(required=True)
+    source = StringField(required=True)
+    intervals = ListField(ListField(DateTimeField()))   # [[start, end], ...] inklusive
+
+    meta = {
+        "auto_create_index": False,
+        "indexes": [
+            {"fields": ["ticker", "source"], "unique": True, "name": "ticker_source"},
+        ],
+    }
+
+
+class sentimentCache(Document):   # Gemini-Bewertungen, damit kein Artikel doppelt bezahlt wird
+    content_hash = StringField(required=True)
+    topic = StringField(required=True)
+    model = StringField(required=True)
+    score = StringField(required=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "auto_create_index": False,
+        "indexes": [
+            {"fields": ["content_hash", "topic", "model"], "unique": True, "name": "hash_topic_model"},
+        ],
+    }
+
+
+class apiQuota(Document):   # Token-Bucket pro Anbieter, geteilt über alle Prozesse
+    provider = StringField(primary_key=True)
+    tokens = FloatField(default=0.0)
+    updated = FloatField(default=0.0)        # Unix-Zeit der letzten Entnahme
+    day = StringField()                      # UTC-Tag des Tageszählers
+    used_today = IntField(default=0)
+    blocked_until = FloatField(default=0.0)  # nach einem 429 bis hierhin pausieren
+
+
+class alphaSeries(Document):   # komplette Alpha-Vantage-Tagesreihe pro Symbol, spaltenweise
+    symbol = StringField(required=True, unique=True)
+    fetched_at = DateTimeField(required=True)
+    dates = ListField(StringField())   # "YYYY-MM-DD", aufsteigend
+    open = ListField(FloatField())
+    high = ListField(FloatField())
+    low = ListField(FloatField())
+    close = ListField(FloatField())
+    adj_close = ListField(FloatField())
+    volume = ListField(FloatField())
+
+    meta = {"auto_create_index": False}
+
+
+class newsCursor(Document):   # bereits vollständig abgerufene NewsAPI-Zeitfenster pro Abfrage
+    query = StringField(required=True)
+    language = StringField(required=True)
+    completed = ListField(StringField())   # Fensterbeginn "YYYY-MM-DDTHH:MM:SS" (UTC)
+    updated_at = DateTimeField()
+
+    meta = {
+        "auto_create_index": False,
+        "indexes": [
+            {"fields": ["query", "language"], "unique": True, "name": "query_language"},
+        ],
+    }
+
+
+class fetchLease(Document):   # prozessübergreifende Sperre für laufende Upstream-Abrufe
+    key = StringField(primary_key=True)
+    owner = StringField(required=True)
+    expires_at = DateTimeField(required=True)
+
+
+DOCUMENTS = [stockDaten, stockBucket, news_Daten, stockCoverage, sentimentCache, apiQuota, alphaSeries, newsCursor, fetchLease]
+
+
+def ensure_indexes():
+    for document in DOCUMENTS:
+        try:
+            document.ensure_indexes()
+        except Exception as e:
+            # z.B. bereits vorhandene Duplikate verhindern einen Unique-Index
+            print(f"Fehler beim Anlegen der Indizes für {document.__name__}: {e}")
+
+
+def _plan_stages(plan: dict) -> list:
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def hot_queries() -> dict:
+    """Die Abfragen aus save_data.py, die immer über einen Index laufen müssen."""
+    now = datetime.now()
+    return {
+        "stock_latest": stockDaten.objects(ticker="AAPL", source="yahoo").order_by('-date'),
+        "stock_range": stockDaten.objects(
+            ticker="AAPL", source="yahoo", date__gte=now - timedelta(days=365), date__lte=now
+        ).order_by('date'),
+        "stock_buckets": stockBucket.objects(
+            ticker="AAPL", source="yahoo", month__gte=now - timedelta(days=365), month__lt=now
+        ).order_by('month'),
+        "news_latest": news_Daten.objects(query="AAPL").order_by('-date'),
+        "news_range": news_Daten.objects(query="AAPL", date__gte=now - timedelta(days=30)).order_by('-date'),
+        "news_page": news_Daten.objects(
+            query="AAPL", date__gte=now - timedelta(days=30)
+        ).order_by('-date', '-id').limit(10),
+        "news_dedup": news_Daten.objects(query="AAPL", title__in=["a", "b"]),
+    }
+
+
+def check_query_plans() -> None:
+    """Wirft einen RuntimeError, wenn eine der Hot-Queries einen Collection-Scan macht."""
+    failures = []
+    for name, qs in hot_queries().items():
+        plan = qs.explain()
+        winning_plan = plan.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        if "COLLSCAN" in stages or "SORT" in stages:
+            failures.append(f"{name}: {' <- '.join(s for s in stages if s)}")
+
+    if failures:
+        raise RuntimeError("Abfragen ohne passenden Index:\n" + "\n".join(failures))
+    print("Alle Hot-Queries verwenden einen Index.")
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    check_query_plans()
@@ -0,0 +1,117 @@
+"""Serverseitige Kursprognosen, einmal pro (Symbol, Modell, letzter Kurs) berechnet."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from coverage import TRADING_DAY
+from metrics import count_cache, span
+
+LOOKBACK_DAYS = 365
+DEFAULT_HORIZON = 30
+MAX_HORIZON = 120
+BAND_Z = 1.96   # 95%-Band
+CACHE_SIZE = 256
+
+Forecast = Tuple[np.ndarray, np.ndarray, np.ndarray]   # (prognose, unten, oben)
+
+
+def _steps(horizon: int) -> np.ndarray:
+    return np.arange(1, horizon + 1, dtype="float64")
+
+
+def linear_trend(close: np.ndarray, horizon: int) -> Forecast:
+    t = np.arange(len(close), dtype="float64")
+    slope, intercept = np.polyfit(t, close, 1)
+    resid_std = np.std(close - (slope * t + intercept), ddof=min(2, len(close) - 1))
+    future = slope * (len(close) - 1 + _steps(horizon)) + intercept
+    return future, future - BAND_Z * resid_std, future + BAND_Z * resid_std
+
+
+def log_linear_trend(close: np.ndarray, horizon: int) -> Forecast:
+    log_close = np.log(close)
+    t = np.arange(len(close), dtype="float64")
+    slope, intercept = np.polyfit(t, log_close, 1)
+    resid_std = np.std(log_close - (slope * t + intercept), ddof=min(2, len(close) - 1))
+    future = slope * (len(close) - 1 + _steps(horizon)) + intercept
+    return np.exp(future), np.exp(future - BAND_Z * resid_std), np.exp(future + BAND_Z * resid_std)
+
+
+def exponential_smoothing(close: np.ndarray, horizon: int, alpha: float = 0.3, beta: float = 0.1) -> Forecast:
+    # Niveau und Trend als exponentiell gewichtete Mittel (Holt-Näherung ohne Python-Schleife)
+    series = pd.Series(close)
+    level = series.ewm(alpha=alpha, adjust=False).mean()
+    trend = level.diff().fillna(0.0).ewm(alpha=beta, adjust=False).mean()
+    steps = _steps(horizon)
+    future = level.iloc[-1] + trend.iloc[-1] * steps
+    resid_std = np.std(close[1:] - (level.shift(1) + trend.shift(1)).to_numpy()[1:]) if len(close) > 1 else 0.0
+    spread = BAND_Z * resid_std * np.sqrt(steps)
+    return future, future - spread, future + spread
+
+
+def drift_volatility(close: np.ndarray, horizon: int) -> Forecast:
+    log_returns = np.diff(np.log(close))
+    mu = log_returns.mean() if len(log_returns) else 0.0
+    sigma = log_returns.std(ddof=1) if len(log_returns) > 1 else 0.0
+    steps = _steps(horizon)
+    base = np.log(close[-1]) + mu * steps
+    spread = BAND_Z * sigma * np.sqrt(steps)
+    return np.exp(base), np.exp(base - spread), np.exp(base + spread)
+
+
+MODELS: Dict[str, Callable[[np.ndarray, int], Forecast]] = {
+    "linear": linear_trend,
+    "loglinear": log_linear_trend,
+    "ets": exponential_smoothing,
+    "drift": drift_volatility,
+}
+
+
+def compute_forecast(frame: pd.DataFrame, model: str, horizon: int = DEFAULT_HORIZON) -> pd.DataFrame:
+    frame = frame.sort_values("date")
+    close = frame["close"].astype("float64").to_numpy()
+    close = close[np.isfinite(close) & (close > 0)]
+    if len(close) < 2:
+        raise ValueError("Zu wenige Kurse für eine Prognose")
+
+    values, lower, upper = MODELS[model](close, horizon)
+    last_date = pd.Timestamp(frame["date"].max()).normalize()
+    dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon, freq=TRADING_DAY)
+
+    return pd.DataFrame({"date": dates, "forecast": values, "lower": lower, "upper": upper})
+
+
+_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cached_forecast(symbol: str, source: str, frame: pd.DataFrame, model: str, horizon: int,
+                    state: dict) -> pd.DataFrame:
+    """Memoisiert pro (Symbol, Quelle, Modell, Horizont, Datenstand).
+
+    ``state`` kommt aus ``stock_data_state`` wie beim ETag; jeder gespeicherte Kurs, auch
+    ein nachgefüllter mitten im Fenster, ändert den Schlüssel und löst eine Neuberechnung aus.
+    """
+    last_bar = pd.Timestamp(frame["date"].max()).isoformat()
+    key = (symbol, source, model, horizon, last_bar, state.get("count"), state.get("last_ingest"))
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            count_cache("forecast", True)
+            return _cache[key]
+    count_cache("forecast", False)
+
+    with span("forecast"):
+        result = compute_forecast(frame, model, horizon)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
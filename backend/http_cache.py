@@ -0,0 +1,66 @@
+"""Bedingte HTTP-Antworten (ETag / Last-Modified / 304) und Cache-Control-Header."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Optional
+
+from flask import Response, request
+
+# Zeiträume in der Vergangenheit ändern sich kaum, aktuelle Zeiträume bei jedem neuen Kurs
+MAX_AGE_SETTLED = int(os.environ.get("HTTP_MAX_AGE_SETTLED", 3600))
+MAX_AGE_LIVE = int(os.environ.get("HTTP_MAX_AGE_LIVE", 60))
+
+
+class Validator:
+    def __init__(self, etag: str, last_modified: Optional[datetime], max_age: int):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.max_age = max_age
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def max_age_for(end: date) -> int:
+    return MAX_AGE_SETTLED if end < date.today() else MAX_AGE_LIVE
+
+
+def build_validator(key: tuple, state: Optional[Dict[str, Any]], max_age: int) -> Optional[Validator]:
+    """ETag aus Anfrage-Schlüssel und Zustand der Daten (Anzahl, neuestes Datum, letzte Ingestion)."""
+    if not state:
+        return None
+    raw = repr((key, state.get("count"), state.get("last_date"), state.get("last_ingest")))
+    etag = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    last_modified = _as_utc(state.get("last_ingest") or state.get("last_date"))
+    return Validator(etag, last_modified, max_age)
+
+
+def is_not_modified(validator: Validator) -> bool:
+    # If-None-Match hat laut RFC 9110 Vorrang vor If-Modified-Since
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(validator.etag)
+    since = request.if_modified_since
+    if since is not None and validator.last_modified is not None:
+        return validator.last_modified <= since
+    return False
+
+
+def apply_cache_headers(response: Response, validator: Validator) -> Response:
+    response.set_etag(validator.etag)
+    if validator.last_modified is not None:
+        response.last_modified = validator.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = validator.max_age
+    return response
+
+
+def not_modified_response(validator: Validator) -> Response:
+    return apply_cache_headers(Response(status=304), validator)
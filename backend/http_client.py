@@ -0,0 +1,143 @@
+"""Gemeinsamer HTTP-Client für die externen APIs.
+
+Eine ``requests.Session`` pro Anbieter hält Verbindungen offen (Keep-Alive,
+Connection-Pool), setzt Connect-/Read-Timeouts und wiederholt fehlgeschlagene
+GET-Anfragen bei Verbindungsfehlern mit exponentiellem Backoff. Statuscodes
+(5xx) werden nur mit ``HTTP_<ANBIETER>_STATUS_RETRIES`` wiederholt, 429 nie.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import count_upstream
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    connect_timeout: float
+    read_timeout: float
+    retries: int = 3
+    # Statuswiederholungen laufen unterhalb von quota.acquire() und kosten Kontingent
+    # ohne Token; für quotierte Anbieter daher standardmäßig aus
+    status_retries: int = 0
+    backoff_factor: float = 0.5
+    pool_size: int = 10
+
+
+def _config(provider: str, connect_timeout: float, read_timeout: float) -> ProviderConfig:
+    prefix = f"HTTP_{provider.upper()}"
+    return ProviderConfig(
+        connect_timeout=float(os.environ.get(f"{prefix}_CONNECT_TIMEOUT", connect_timeout)),
+        read_timeout=float(os.environ.get(f"{prefix}_READ_TIMEOUT", read_timeout)),
+        retries=int(os.environ.get(f"{prefix}_RETRIES", 3)),
+        status_retries=int(os.environ.get(f"{prefix}_STATUS_RETRIES", 0)),
+    )
+
+
+PROVIDERS = {
+    "newsapi": _config("newsapi", connect_timeout=3.05, read_timeout=10),
+    # outputsize=full kann mehrere MB groß sein
+    "alpha_vantage": _config("alpha_vantage", connect_timeout=3.05, read_timeout=30),
+}
+
+# ohne 429: das behandeln die Aufrufer über report_rate_limited bzw. bei NewsAPI
+# (Tageslimit erreicht) über report_daily_exhausted
+RETRY_STATUS = (500, 502, 503, 504)
+LATENCY_WINDOW = 500
+
+
+class LatencyStats:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.calls += 1
+            self.total_seconds += seconds
+            if not ok:
+                self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            calls, errors, total = self.calls, self.errors, self.total_seconds
+
+        def pct(q: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))], 4)
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "avg_seconds": round(total / calls, 4) if calls else None,
+            "p50_seconds": pct(0.5),
+            "p95_seconds": pct(0.95),
+        }
+
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+latency: Dict[str, LatencyStats] = {provider: LatencyStats() for provider in PROVIDERS}
+
+
+def _build_session(config: ProviderConfig) -> requests.Session:
+    retry = Retry(
+        total=config.retries,
+        connect=config.retries,
+        read=config.retries,
+        status=config.status_retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # letzte Antwort zurückgeben, Statusprüfung macht der Aufrufer
+    )
+    adapter = HTTPAdapter(pool_connections=config.pool_size, pool_maxsize=config.pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(provider: str) -> requests.Session:
+    with _sessions_lock:
+        if provider not in _sessions:
+            _sessions[provider] = _build_session(PROVIDERS[provider])
+        return _sessions[provider]
+
+
+def http_get(provider: str, url: str, params: Optional[dict] = None) -> requests.Response:
+    config = PROVIDERS[provider]
+    t0 = time.perf_counter()
+    ok = False
+    status = "error"
+    try:
+        response = get_session(provider).get(
+            url, params=params, timeout=(config.connect_timeout, config.read_timeout)
+        )
+        ok = response.status_code < 400
+        status = str(response.status_code)
+        return response
+    finally:
+        latency[provider].record(time.perf_counter() - t0, ok)
+        count_upstream(provider, status)
+
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+    return {provider: stats.snapshot() for provider, stats in latency.items()}
@@ -0,0 +1,122 @@
+"""Vektorisierte technische Indikatoren auf Basis der gespeicherten Tageskurse."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from metrics import count_cache, span
+
+TRADING_DAYS_PER_YEAR = 252
+CACHE_SIZE = 256
+
+
+def sma(close: pd.Series, window: int = 20) -> Dict[str, pd.Series]:
+    return {f"sma_{window}": close.rolling(window, min_periods=window).mean()}
+
+
+def ema(close: pd.Series, span: int = 20) -> Dict[str, pd.Series]:
+    return {f"ema_{span}": close.ewm(span=span, adjust=False, min_periods=span).mean()}
+
+
+def rsi(close: pd.Series, window: int = 14) -> Dict[str, pd.Series]:
+    delta = close.diff()
+    # Glättung nach Wilder entspricht einem EWM mit alpha = 1/window
+    gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    rs = gain / loss.replace(0, np.nan)
+    values = 100 - 100 / (1 + rs)
+    values = values.where(loss != 0, 100.0).where(gain.notna())
+    return {f"rsi_{window}": values}
+
+
+def macd(close: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, pd.Series]:
+    line = close.ewm(span=fast, adjust=False).mean() - close.ewm(span=slow, adjust=False).mean()
+    line = line.where(np.arange(len(close)) >= slow - 1)
+    signal_line = line.ewm(span=signal, adjust=False, min_periods=signal).mean()
+    return {"macd": line, "macd_signal": signal_line, "macd_hist": line - signal_line}
+
+
+def bollinger(close: pd.Series, window: int = 20, num_std: float = 2.0) -> Dict[str, pd.Series]:
+    rolling = close.rolling(window, min_periods=window)
+    mid = rolling.mean()
+    std = rolling.std(ddof=0)
+    return {"bb_mid": mid, "bb_upper": mid + num_std * std, "bb_lower": mid - num_std * std}
+
+
+def volatility(close: pd.Series, window: int = 20) -> Dict[str, pd.Series]:
+    log_returns = np.log(close).diff()
+    annualized = log_returns.rolling(window, min_periods=window).std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+    return {f"volatility_{window}": annualized}
+
+
+def drawdown(close: pd.Series) -> Dict[str, pd.Series]:
+    return {"drawdown": close / close.cummax() - 1.0}
+
+
+INDICATORS: Dict[str, Callable[[pd.Series], Dict[str, pd.Series]]] = {
+    "sma": sma,
+    "ema": ema,
+    "rsi": rsi,
+    "macd": macd,
+    "bollinger": bollinger,
+    "volatility": volatility,
+    "drawdown": drawdown,
+}
+
+
+def parse_indicator_names(value: str | None) -> List[str]:
+    if not value:
+        return list(INDICATORS)
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in INDICATORS]
+    if unknown:
+        raise ValueError(
+            f"Unbekannte Indikatoren: {', '.join(unknown)} (erlaubt: {', '.join(INDICATORS)})"
+        )
+    return list(dict.fromkeys(names))
+
+
+def compute_indicators(frame: pd.DataFrame, names: Iterable[str]) -> pd.DataFrame:
+    """Berechnet die Indikatoren auf dem DataFrame von ``fetch_and_store_stock_data``."""
+    frame = frame.sort_values("date")
+    close = frame["close"].astype("float64").reset_index(drop=True)
+
+    result = {"date": frame["date"].reset_index(drop=True), "close": close}
+    for name in names:
+        result.update(INDICATORS[name](close))
+    return pd.DataFrame(result)
+
+
+_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cached_indicators(symbol: str, source: str, frame: pd.DataFrame, names: List[str], start: str, end: str,
+                      state: dict) -> pd.DataFrame:
+    """Wie ``compute_indicators``, aber pro (Symbol, Quelle, Datenstand, Zeitraum) gecacht.
+
+    ``state`` ist derselbe Zustand wie fürs ETag (``stock_data_state``): auch nachgefüllte
+    Lücken mitten im Zeitraum ändern Anzahl bzw. letzte Ingestion und damit den Schlüssel.
+    """
+    key = (symbol, source, state.get("count"), state.get("last_ingest"), start, end, tuple(names))
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            count_cache("indicators", True)
+            return _cache[key]
+    count_cache("indicators", False)
+
+    with span("indicators"):
+        result = compute_indicators(frame, names)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,274 @@
+"""Leichtgewichtige Metriken im Prometheus-Textformat.
+
+Zeitmessung pro Pipeline-Stufe (``span``), Zähler für Upstream-Aufrufe und
+Cache-Treffer sowie MongoDB-Befehle über einen pymongo-``CommandListener``.
+Pro Request werden die Stufen zusätzlich gesammelt und auf Wunsch als
+``Server-Timing``-Header ausgegeben (``METRICS_SERVER_TIMING=1``).
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import g, request
+from pymongo import monitoring
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "0") == "1"
+PREFIX = "finanz"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in sorted(self.values().items(), key=str)
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=SECONDS_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # {labels: [zähler pro bucket..., summe, anzahl]}
+        self._values: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+
+        lines = []
+        for key, state in sorted(values.items(), key=str):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, INF_LABEL)} {int(state[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {int(state[-1])}")
+        return lines
+
+
+stage_seconds = Histogram("stage_seconds", "Dauer einzelner Pipeline-Stufen", ["stage"])
+upstream_requests = Counter("upstream_requests_total", "Aufrufe externer APIs nach Anbieter und Status", ["provider", "status"])
+cache_requests = Counter("cache_requests_total", "Cache-Zugriffe nach Cache und Ergebnis", ["cache", "result"])
+mongo_commands = Counter("mongo_commands_total", "MongoDB-Befehle nach Befehl und Ergebnis", ["command", "status"])
+mongo_seconds = Histogram("mongo_command_seconds", "Dauer der MongoDB-Befehle", ["command"])
+provider_seconds = Histogram("provider_seconds", "Dauer der Kursabrufe pro Anbieter", ["provider", "result"])
+provider_events = Counter("provider_events_total", "Fallbacks und Hedged Requests pro Anbieter", ["provider", "event"])
+http_requests = Histogram("http_request_seconds", "Dauer der HTTP-Requests", ["endpoint", "status"])
+request_mongo_ops = Histogram("request_mongo_commands", "MongoDB-Befehle pro HTTP-Request", ["endpoint"], COUNT_BUCKETS)
+
+REGISTRY = [
+    stage_seconds, upstream_requests, cache_requests, mongo_commands, mongo_seconds,
+    provider_seconds, provider_events, http_requests, request_mongo_ops,
+]
+
+
+class Trace:
+    """Stufen-Zeiten und Mongo-Befehle eines einzelnen Requests."""
+
+    __slots__ = ("started", "stages", "mongo_ops", "mongo_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.mongo_ops = 0
+        self.mongo_seconds = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        entries.append(f'mongo;desc="{self.mongo_ops} ops";dur={self.mongo_seconds * 1000:.1f}')
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("metrics_trace", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Misst die Dauer eines Blocks als Stufe ``name``."""
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        stage_seconds.observe(elapsed, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+def timed(name: str):
+    """Dekorator-Variante von ``span``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_upstream(provider: str, status) -> None:
+    if ENABLED:
+        upstream_requests.inc(provider=provider, status=str(status))
+
+
+def count_cache(cache: str, hit: bool, amount: int = 1) -> None:
+    if ENABLED and amount:
+        cache_requests.inc(amount, cache=cache, result="hit" if hit else "miss")
+
+
+class _MongoListener(monitoring.CommandListener):
+    def started(self, event) -> None:
+        pass
+
+    def _finish(self, event, status: str) -> None:
+        seconds = event.duration_micros / 1_000_000
+        mongo_commands.inc(command=event.command_name, status=status)
+        mongo_seconds.observe(seconds, command=event.command_name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.mongo_ops += 1
+            trace.mongo_seconds += seconds
+
+    def succeeded(self, event) -> None:
+        self._finish(event, "ok")
+
+    def failed(self, event) -> None:
+        self._finish(event, "error")
+
+
+_listener_installed = False
+
+
+def install_mongo_listener() -> None:
+    """Muss vor dem Verbindungsaufbau laufen, damit der MongoClient den Listener übernimmt."""
+    global _listener_installed
+    if ENABLED and not _listener_installed:
+        monitoring.register(_MongoListener())
+        _listener_installed = True
+
+
+def init_app(app) -> None:
+    """Startet pro Request einen Trace und misst Dauer und Mongo-Befehle."""
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def _start_trace():
+        g.metrics_token = _trace.set(Trace())
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = _trace.get()
+        if trace is None:
+            return response
+        endpoint = request.endpoint or "unbekannt"
+        http_requests.observe(time.perf_counter() - trace.started, endpoint=endpoint, status=str(response.status_code))
+        request_mongo_ops.observe(trace.mongo_ops, endpoint=endpoint)
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = trace.server_timing()
+        return response
+
+    @app.teardown_request
+    def _reset_trace(_exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            _trace.reset(token)
+
+
+def _cache_ratios() -> List[str]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in cache_requests.values().items():
+        hits_total = totals.setdefault(cache, [0, 0])
+        hits_total[1] += value
+        if result == "hit":
+            hits_total[0] += value
+
+    name = f"{PREFIX}_cache_hit_ratio"
+    lines = [f"# HELP {name} Anteil der Cache-Treffer seit dem Start", f"# TYPE {name} gauge"]
+    for cache, (hits, total) in sorted(totals.items()):
+        lines.append(f'{name}{{cache="{_escape(cache)}"}} {hits / total if total else 0:.4f}')
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    lines.extend(_cache_ratios())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,68 @@
+"""
+Überträgt vorhandene stockDaten-Dokumente in das Bucket-Layout (stockBucket).
+
+Die alten Dokumente bleiben unverändert; danach kann mit STOCK_STORAGE=bucket
+umgestellt werden. Mehrfaches Ausführen ist unkritisch, Tage werden überschrieben.
+
+    python migrate_buckets.py [TICKER ...]
+"""
+import sys
+
+import pandas as pd
+
+from database import ensure_indexes, stockBucket, stockDaten
+from storage import ROW_FIELDS, BucketStore
+
+MIGRATION_BATCH_SIZE = 5000
+
+
+def _pairs(tickers=None):
+    match = {"ticker": {"$in": list(tickers)}} if tickers else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"ticker": "$ticker", "source": "$source"}, "count": {"$sum": 1}}},
+        {"$sort": {"_id.ticker": 1, "_id.source": 1}},
+    ]
+    for row in stockDaten._get_collection().aggregate(pipeline):
+        yield row["_id"]["ticker"], row["_id"]["source"], row["count"]
+
+
+def migrate_pair(ticker: str, source: str, store: BucketStore, batch_size: int = MIGRATION_BATCH_SIZE) -> dict:
+    stats = {"inserted": 0, "updated": 0, "rejected": 0}
+    projection = {"_id": 0, "date": 1, **{col: 1 for col in ROW_FIELDS}}
+    cursor = stockDaten._get_collection().find(
+        {"ticker": ticker, "source": source}, projection
+    ).sort("date", 1).batch_size(batch_size)
+
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            _save_batch(batch, ticker, source, store, stats)
+            batch = []
+    if batch:
+        _save_batch(batch, ticker, source, store, stats)
+    return stats
+
+
+def _save_batch(docs: list, ticker: str, source: str, store: BucketStore, stats: dict) -> None:
+    frame = pd.DataFrame(docs).reindex(columns=["date"] + ROW_FIELDS)
+    frame = frame.assign(ticker=ticker, source=source)
+    for key, value in store.save_frame(frame).items():
+        stats[key] += value
+
+
+def migrate(tickers=None) -> None:
+    ensure_indexes()
+    store = BucketStore()
+    for ticker, source, count in _pairs(tickers):
+        stats = migrate_pair(ticker, source, store)
+        buckets = stockBucket.objects(ticker=ticker, source=source).count()
+        print(
+            f"Migriert ({source}/{ticker}): {count} Tage -> {buckets} Buckets "
+            f"({stats['inserted']} neu, {stats['updated']} aktualisiert, {stats['rejected']} verworfen)."
+        )
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1:] or None)
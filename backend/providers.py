@@ -0,0 +1,233 @@
+"""Kursanbieter mit Fallback-Reihenfolge und optionalen Hedged Requests.
+
+Jeder Anbieter liefert einen bereinigten DataFrame im Format von ``build_stock_frame``.
+``source`` bleibt dabei die angefragte Kursreihe (yahoo/alpha_vantage), die Spalte
+``provider`` hält fest, woher die Zeilen tatsächlich stammen. ``None`` heißt, der Abruf
+ist fehlgeschlagen; ein leerer DataFrame, dass der Anbieter erfolgreich "keine Kurse" meldete.
+
+Reihenfolge pro Reihe über ``PROVIDER_ORDER_<SOURCE>`` (Standard ``yahoo,local`` bzw.
+``alpha_vantage,local``; Wechsel zwischen den Reihen nur, wenn ausdrücklich konfiguriert).
+Mit ``PROVIDER_HEDGING=1`` wird der nächste Anbieter parallel gestartet, sobald der
+aktuelle länger braucht als sein beobachtetes p95.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from api_calls import get_stock_data_alpha_vantage, get_stock_data_yfinance
+from DatenBearbeiten import build_stock_frame, empty_stock_frame, prepare_clean_alpha_data, prepare_clean_yahoo_data
+from http_client import LatencyStats
+from metrics import provider_events, provider_seconds, span
+
+HEDGING = os.environ.get("PROVIDER_HEDGING", "0") == "1"
+HEDGE_MIN_SAMPLES = int(os.environ.get("PROVIDER_HEDGE_MIN_SAMPLES", 20))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("PROVIDER_HEDGE_DEFAULT_DELAY", 2.0))   # Sekunden, solange p95 fehlt
+HEDGE_MIN_DELAY = float(os.environ.get("PROVIDER_HEDGE_MIN_DELAY", 0.05))
+LOCAL_DATA_DIR = os.environ.get("LOCAL_DATA_DIR")
+
+# Standard nur innerhalb derselben Reihe: ein Wechsel zu Alpha Vantage kostet Quote und
+# mischt unbereinigte Schlusskurse in die splitbereinigte Yahoo-Reihe -> nur auf Wunsch
+DEFAULT_ORDER = {
+    "yahoo": "yahoo,local",
+    "alpha_vantage": "alpha_vantage,local",
+}
+
+# geteilter Pool, damit Hedged Requests keinen Thread-Start kosten
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("PROVIDER_MAX_WORKERS", 8)), thread_name_prefix="provider")
+
+
+def _to_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class Provider:
+    name = ""
+
+    def __init__(self):
+        self.stats = LatencyStats()
+
+    def available(self) -> bool:
+        return True
+
+    def _fetch(self, ticker: str, start: str, end: str, source: str) -> Optional[pd.DataFrame]:
+        raise NotImplementedError
+
+    def fetch(self, ticker: str, start: str, end: str, source: str) -> Optional[pd.DataFrame]:
+        """Bereinigte Kurse für [start, end], leer ohne Kurse oder None bei Fehlern."""
+        t0 = time.perf_counter()
+        df = None
+        try:
+            df = self._fetch(ticker, start, end, source)
+        except Exception as e:
+            print(f"Fehler beim Anbieter {self.name} für {ticker}: {e}")
+        elapsed = time.perf_counter() - t0
+        self.stats.record(elapsed, df is not None)
+        result = "error" if df is None else "empty" if df.empty else "ok"
+        provider_seconds.observe(elapsed, provider=self.name, result=result)
+        if df is None:
+            return None
+        return df.assign(provider=self.name)
+
+    def hedge_delay(self) -> float:
+        snapshot = self.stats.snapshot()
+        if snapshot["calls"] < HEDGE_MIN_SAMPLES or snapshot["p95_seconds"] is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, snapshot["p95_seconds"])
+
+
+class YahooProvider(Provider):
+    name = "yahoo"
+
+    def _fetch(self, ticker, start, end, source):
+        # yfinance behandelt 'end' exklusiv, der Zeitraum hier ist inklusive
+        end_exclusive = (_to_date(end) + timedelta(days=1)).isoformat()
+        with span("upstream_yahoo"):
+            raw = get_stock_data_yfinance(ticker, start, end_exclusive)
+        if raw is None:
+            return None
+        if raw.empty:
+            return empty_stock_frame(ticker, source)
+        with span("prepare"):
+            return prepare_clean_yahoo_data(raw, ticker, source)
+
+
+class AlphaVantageProvider(Provider):
+    name = "alpha_vantage"
+
+    def _fetch(self, ticker, start, end, source):
+        with span("upstream_alpha_vantage"):
+            raw = get_stock_data_alpha_vantage(ticker, start, end)
+        if raw is None:
+            return None
+        with span("prepare"):
+            return prepare_clean_alpha_data(raw, ticker, source)
+
+
+class LocalFileProvider(Provider):
+    """Kurse aus ``LOCAL_DATA_DIR/<TICKER>.parquet`` oder ``.csv`` (Spalten date, open, high, low, close, volume)."""
+
+    name = "local"
+
+    def __init__(self, directory: Optional[str] = LOCAL_DATA_DIR):
+        super().__init__()
+        self.directory = directory
+
+    def available(self) -> bool:
+        return bool(self.directory) and os.path.isdir(self.directory)
+
+    def _read(self, ticker: str) -> Optional[pd.DataFrame]:
+        for extension, reader in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+            path = os.path.join(self.directory, f"{ticker}{extension}")
+            if os.path.exists(path):
+                return reader(path)
+        return None
+
+    def _fetch(self, ticker, start, end, source):
+        raw = self._read(ticker)
+        if raw is None:
+            return None
+
+        with span("prepare"):
+            df = raw.rename(columns=str.lower).rename(columns={"adj close": "adj_close"})
+            dates = pd.to_datetime(df["date"])
+            in_range = ((dates >= pd.Timestamp(start)) & (dates < pd.Timestamp(end) + pd.Timedelta(days=1))).to_numpy()
+            columns = {col: df[col].to_numpy()[in_range] for col in ("open", "high", "low", "close", "volume")}
+            if "adj_close" in df.columns:
+                columns["adj_close"] = df["adj_close"].to_numpy()[in_range]
+            return build_stock_frame(dates.to_numpy()[in_range], columns, ticker, source)
+
+
+PROVIDERS: Dict[str, Provider] = {
+    provider.name: provider for provider in (YahooProvider(), AlphaVantageProvider(), LocalFileProvider())
+}
+
+
+def provider_order(source: str) -> List[Provider]:
+    configured = os.environ.get(f"PROVIDER_ORDER_{source.upper()}", DEFAULT_ORDER.get(source, source))
+    names = [name.strip() for name in configured.split(",") if name.strip()]
+    return [PROVIDERS[name] for name in names if name in PROVIDERS and PROVIDERS[name].available()]
+
+
+def primary_provider(source: str) -> Optional[str]:
+    order = provider_order(source)
+    return order[0].name if order else None
+
+
+def _fetch_sequential(order, ticker, start, end, source) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    primary = None
+    for position, provider in enumerate(order):
+        if position:
+            provider_events.inc(provider=provider.name, event="fallback")
+        df = provider.fetch(ticker, start, end, source)
+        if position == 0:
+            primary = df
+        if df is not None and not df.empty:
+            return df, provider.name
+    # leer nur, wenn der Hauptanbieter der Reihe selbst "keine Kurse" gemeldet hat
+    return primary, None
+
+
+def _fetch_hedged(order, ticker, start, end, source) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    remaining = list(order)
+    pending = {}
+    deadline = None
+    primary = None
+
+    def submit():
+        nonlocal deadline
+        provider = remaining.pop(0)
+        pending[_pool.submit(provider.fetch, ticker, start, end, source)] = provider
+        deadline = time.monotonic() + provider.hedge_delay()
+        return provider
+
+    submit()
+    while pending:
+        timeout = max(0.0, deadline - time.monotonic()) if remaining else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            # aktueller Anbieter ist langsamer als sein p95 -> den nächsten zusätzlich starten
+            provider_events.inc(provider=submit().name, event="hedge")
+            continue
+
+        for future in done:
+            provider = pending.pop(future)
+            df = future.result()
+            if provider is order[0]:
+                primary = df
+            if df is not None and not df.empty:
+                # die übrigen Anfragen laufen im Hintergrund aus, ihr Ergebnis wird verworfen
+                return df, provider.name
+
+        if not pending and remaining:
+            provider_events.inc(provider=submit().name, event="fallback")
+
+    return primary, None
+
+
+def fetch_stock_frame(ticker: str, start: str, end: str, source: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    """Kurse der Reihe ``source`` vom ersten Anbieter, der Daten liefert; (DataFrame, Anbieter).
+
+    Liefert keiner Kurse, ist das Ergebnis (leerer DataFrame, None), wenn der Hauptanbieter
+    erfolgreich "keine Kurse" gemeldet hat, und (None, None), wenn er fehlgeschlagen ist.
+    """
+    order = provider_order(source)
+    if not order:
+        print(f"Kein Anbieter für die Kursreihe '{source}' konfiguriert.")
+        return None, None
+
+    df, name = (_fetch_hedged if HEDGING else _fetch_sequential)(order, ticker, start, end, source)
+    if name is not None and name != order[0].name:
+        print(f"Kurse für {source}/{ticker} kamen vom Ersatzanbieter {name}.")
+    return df, name
+
+
+def provider_stats() -> Dict[str, dict]:
+    return {name: provider.stats.snapshot() for name, provider in PROVIDERS.items()}
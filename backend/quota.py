@@ -0,0 +1,141 @@
+"""Token-Bucket-Quoten pro API-Anbieter mit Tagesbudget, gespeichert in MongoDB.
+
+Der Zustand liegt in der Collection ``api_quota`` und wird per Compare-and-Set
+aktualisiert, damit mehrere Flask-Worker dasselbe Free-Tier-Kontingent teilen.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from mongoengine import NotUniqueError
+
+from database import apiQuota
+
+
+@dataclass(frozen=True)
+class QuotaConfig:
+    per_minute: float
+    burst: int
+    daily: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+
+def _config(provider: str, per_minute: float, burst: int, daily: int) -> QuotaConfig:
+    prefix = f"QUOTA_{provider.upper()}"
+    return QuotaConfig(
+        per_minute=float(os.environ.get(f"{prefix}_PER_MINUTE", per_minute)),
+        burst=int(os.environ.get(f"{prefix}_BURST", burst)),
+        daily=int(os.environ.get(f"{prefix}_DAILY", daily)),
+    )
+
+
+# Voreinstellungen entsprechen den jeweiligen Free-Plänen
+PROVIDERS = {
+    "newsapi": _config("newsapi", per_minute=60, burst=5, daily=100),
+    "alpha_vantage": _config("alpha_vantage", per_minute=5, burst=5, daily=25),
+    "gemini": _config("gemini", per_minute=15, burst=15, daily=1000),
+}
+
+DEFAULT_TIMEOUT = float(os.environ.get("QUOTA_WAIT_TIMEOUT", 30))
+
+_SHED = -1.0
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _load_state(provider: str, config: QuotaConfig) -> apiQuota:
+    state = apiQuota.objects(provider=provider).first()
+    if state is None:
+        try:
+            apiQuota(
+                provider=provider, tokens=float(config.burst), updated=time.time(), day=_today()
+            ).save(force_insert=True)
+        except NotUniqueError:
+            pass  # parallel von einem anderen Prozess angelegt
+        state = apiQuota.objects(provider=provider).first()
+    return state
+
+
+def _try_take(provider: str, config: QuotaConfig) -> float:
+    """0 = Token entnommen, >0 = Sekunden bis zum nächsten Versuch, _SHED = Tagesbudget erschöpft."""
+    state = _load_state(provider, config)
+    now = time.time()
+    today = _today()
+
+    used_today = state.used_today if state.day == today else 0
+    if used_today >= config.daily:
+        return _SHED
+    if state.blocked_until > now:
+        return state.blocked_until - now
+
+    tokens = min(float(config.burst), state.tokens + (now - state.updated) * config.rate)
+    if tokens < 1.0:
+        return (1.0 - tokens) / config.rate
+
+    updated = apiQuota.objects(provider=provider, updated=state.updated, tokens=state.tokens).update_one(
+        set__tokens=tokens - 1.0,
+        set__updated=now,
+        set__day=today,
+        set__used_today=used_today + 1,
+    )
+    if updated:
+        return 0.0
+    # ein anderer Prozess war schneller -> kurz warten und neu lesen
+    return random.uniform(0.01, 0.05)
+
+
+def acquire(provider: str, timeout: Optional[float] = DEFAULT_TIMEOUT) -> bool:
+    """Blockiert, bis ein Aufruf erlaubt ist. False, wenn das Budget erschöpft ist oder
+    die Wartezeit ``timeout`` überschreiten würde (Load-Shedding)."""
+    config = PROVIDERS[provider]
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    while True:
+        wait = _try_take(provider, config)
+        if wait == 0.0:
+            return True
+        if wait == _SHED:
+            print(f"Tagesbudget für '{provider}' erschöpft ({config.daily} Aufrufe).")
+            return False
+        if deadline is not None and time.monotonic() + wait > deadline:
+            print(f"Quota '{provider}': Wartezeit {wait:.1f}s überschreitet das Limit, Anfrage verworfen.")
+            return False
+        time.sleep(wait)
+
+
+def report_rate_limited(provider: str, retry_after: Optional[float] = None) -> None:
+    """Nach einem 429 alle Prozesse für ``retry_after`` Sekunden pausieren lassen."""
+    config = PROVIDERS[provider]
+    pause = retry_after if retry_after is not None else 60.0 / max(config.per_minute, 1.0)
+    until = time.time() + pause
+    _load_state(provider, config)
+    apiQuota.objects(provider=provider, blocked_until__lt=until).update_one(
+        set__blocked_until=until, set__tokens=0.0, set__updated=time.time()
+    )
+    print(f"Rate-Limit von '{provider}' gemeldet, pausiere {pause:.0f}s.")
+
+
+def report_daily_exhausted(provider: str) -> None:
+    """Anbieter meldet das Tageslimit als erreicht: Budget für heute in allen Prozessen auf 0."""
+    config = PROVIDERS[provider]
+    _load_state(provider, config)
+    apiQuota.objects(provider=provider).update_one(set__day=_today(), set__used_today=config.daily)
+    print(f"Tageslimit von '{provider}' erreicht, keine weiteren Aufrufe bis morgen (UTC).")
+
+
+def parse_retry_after(value) -> Optional[float]:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
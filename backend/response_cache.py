@@ -0,0 +1,106 @@
+"""Begrenzter In-Process-Cache für fertige API-Antworten (LRU + TTL + Byte-Budget).
+
+Die Ingestion in ``save_data.py`` invalidiert betroffene Einträge über Tags wie
+``("stock", ticker, source)`` oder ``("news", query)``.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional
+
+from metrics import count_cache
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    validator: Any
+    tags: FrozenSet[Hashable]
+    expires: float
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = len(self.body)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+            else:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+        count_cache("response", entry is not None)
+        return entry
+
+    def put(self, key: Hashable, body: bytes, validator: Any = None,
+            tags: Iterable[Hashable] = (), ttl: Optional[float] = None) -> None:
+        entry = CacheEntry(body, validator, frozenset(tags), time.monotonic() + (self.ttl if ttl is None else ttl))
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, tag: Hashable) -> int:
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if tag in entry.tags]
+            for key in keys:
+                self._remove(key)
+            self._counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 512)),
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 60)),
+)
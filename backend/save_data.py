@@ -1,18 +1,34 @@
+import base64
+import os
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
 
 from api_calls import (
-    get_stock_data_yfinance,
-    get_stock_data_alpha_vantage,
-    get_news_from_news_api
-)
-from DatenBearbeiten import (
-    prepare_yahoo_data,
-    prepare_alpha_data,
-    prepare_news_data,
-    clean_stock_data
+    get_news_from_news_api,
+    get_news_from_news_api_parallel,
+    mark_news_windows
 )
+from DatenBearbeiten import prepare_news_data
 from database import stockDaten, news_Daten
+from storage import stock_store, to_mongo_dates
+from providers import PROVIDERS, fetch_stock_frame, primary_provider
+from response_cache import response_cache
+import columnar_cache
+from singleflight import coalesce
+from metrics import span, timed
+from coverage import (
+    add_coverage,
+    last_settled_day,
+    load_coverage,
+    missing_intervals,
+    trading_days,
+    trim_to_trading_days,
+)
 
 
 def to_date(date_str):
@@ -20,95 +36,315 @@ def to_date(date_str):
 
 
 def run_yahoo_pipeline(ticker: str, start: str, end: str):
-    raw = get_stock_data_yfinance(ticker, start, end)
-    if raw is None: return None
-    df_prepared = prepare_yahoo_data(raw, ticker)
-    df_clean = clean_stock_data(df_prepared)
-    return df_clean
+    return PROVIDERS["yahoo"].fetch(ticker, start, end, "yahoo")
 
 
 def run_alpha_pipeline(ticker: str, start: str, end: str):
-    raw = get_stock_data_alpha_vantage(ticker, start, end)
-    if raw is None: return None
-    df_prepared = prepare_alpha_data(raw, ticker)
-    df_clean = clean_stock_data(df_prepared)
-    return df_clean
+    return PROVIDERS["alpha_vantage"].fetch(ticker, start, end, "alpha_vantage")
 
 
 def run_news_pipeline(query: str, from_date: str):
-    raw = get_news_from_news_api(query, from_date)
+    with span("upstream_newsapi"):
+        raw = get_news_from_news_api(query, from_date)
     if raw is None: return None
-    df_news = prepare_news_data(raw, query)
+    with span("prepare_news"):
+        df_news = prepare_news_data(raw, query)
     return df_news
 
 
-def _run_pipeline_and_save(ticker, start, end, source):
-    if source == 'yahoo':
-        df = run_yahoo_pipeline(ticker, start, end)
-    else:
-        df = run_alpha_pipeline(ticker, start, end)
+MAX_FETCH_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", 8))
+# leere Antworten gelten nur für kurze Lücken als abgedeckt (Sonderschließungen); bei
+# längeren steckt eher ein Ausfall dahinter, die werden beim nächsten Aufruf neu versucht
+EMPTY_GAP_MAX_DAYS = int(os.environ.get("STOCK_EMPTY_GAP_MAX_DAYS", 3))
+# "sequential" (ein Date-Walker) oder "parallel" (Tages-/Stundenfenster mit Cursor)
+NEWS_FETCH_MODE = os.environ.get("NEWS_FETCH_MODE", "sequential")
+NEWS_WINDOW = os.environ.get("NEWS_WINDOW", "day")
+
+
+def _save_stock_frame_per_row(df: pd.DataFrame) -> dict:
+    stats = {"inserted": 0, "updated": 0, "rejected": 0}
+    for _, row in df.iterrows():
+        try:
+            stockDaten(
+                date=row["date"],
+                ticker=row["ticker"],
+                source=row["source"],
+                open=row["open"],
+                high=row["high"],
+                low=row["low"],
+                close=row["close"],
+                adj_close=row.get("adj_close"),
+                volume=row["volume"],
+                provider=row.get("provider"),
+                ingested_at=datetime.utcnow()
+            ).save()
+            stats["inserted"] += 1
+        except Exception:
+            stats["rejected"] += 1
+    return stats
+
+
+def _run_pipeline_and_save(ticker, start, end, source, bulk=True):
+    # erster Anbieter der Fallback-Reihenfolge, der Daten liefert
+    df, provider = fetch_stock_frame(ticker, start, end, source)
+
+    if df is None:
+        return None
+    if df.empty:
+        # erfolgreich abgerufen, aber keine Kurse: für _fill_gap kein Fehler
+        print(f"Keine Kurse ({source}/{ticker}) im Zeitraum {start} bis {end}.")
+        return {"inserted": 0, "updated": 0, "rejected": 0, "empty": True}
+
+    with span("save"):
+        if bulk or stock_store.name != "document":
+            stats = stock_store.save_frame(df)
+        else:
+            stats = _save_stock_frame_per_row(df)
+
+    if stats["inserted"] or stats["updated"]:
+        response_cache.invalidate(("stock", ticker, source))
+        written = to_mongo_dates(df["date"].dropna())
+        if written:
+            columnar_cache.invalidate(ticker, source, min(written), max(written))
+
+    if provider != primary_provider(source):
+        # Ersatzanbieter (z.B. lokale Datei) kann früher enden: nur bis zum letzten gelieferten
+        # Tag als abgedeckt markieren, den Rest holt später wieder der Hauptanbieter
+        stats["covered_through"] = pd.Timestamp(df["date"].max()).date()
+
+    print(
+        f"Gespeichert ({source}/{ticker}): {stats['inserted']} neu, "
+        f"{stats['updated']} aktualisiert, {stats['rejected']} verworfen."
+    )
+    return stats
+
+
+NEWS_FIELDS = ["description", "content", "source", "author", "url"]
+# insert_many umgeht die mongoengine-Validierung, Pflichtfelder daher selbst prüfen
+NEWS_REQUIRED = [name for name, field in news_Daten._fields.items() if field.required and name != "id"]
+
+
+@timed("save_news")
+def _bulk_save_news_frame(df: pd.DataFrame, query: str) -> dict:
+    """Dedupliziert alle Artikel mit einer $in-Abfrage und schreibt nur neue in einem Bulk-Insert."""
+    stats = {"inserted": 0, "duplicates": 0, "rejected": 0}
+    mongo_calls = 0
+
+    # wie news_Daten(...).save(): Artikel ohne Pflichtfeld (z.B. source=None) verwerfen
+    complete = df.reindex(columns=NEWS_REQUIRED).notna().all(axis=1)
+    stats["rejected"] = int((~complete).sum())
+    df = df[complete]
+
+    df = df.drop_duplicates(subset=["title"])
+    titles = df["title"].tolist()
+
+    collection = news_Daten._get_collection()
+    existing = {
+        doc["title"] for doc in collection.find(
+            {"query": query, "title": {"$in": titles}}, {"title": 1, "_id": 0}
+        )
+    }
+    mongo_calls += 1
+
+    new_rows = df[~df["title"].isin(existing)]
+    stats["duplicates"] = len(df) - len(new_rows)
+
+    if not new_rows.empty:
+        dates = to_mongo_dates(new_rows["date"])
+        columns = {
+            col: new_rows[col].astype(object).where(new_rows[col].notna(), None).tolist()
+            for col in NEWS_FIELDS
+        }
+        ingested_at = datetime.utcnow()
+        docs = [
+            {"date": d, "title": t, "query": query, "ingested_at": ingested_at,
+             **{col: columns[col][i] for col in NEWS_FIELDS}}
+            for i, (d, t) in enumerate(zip(dates, new_rows["title"].tolist()))
+        ]
+        try:
+            result = collection.insert_many(docs, ordered=False)
+            stats["inserted"] = len(result.inserted_ids)
+        except BulkWriteError as exc:
+            stats["inserted"] = exc.details.get("nInserted", 0)
+            stats["rejected"] += len(exc.details.get("writeErrors", []))
+        mongo_calls += 1
+
+    if stats["inserted"]:
+        response_cache.invalidate(("news", query))
+
+    print(
+        f"News gespeichert ('{query}'): {stats['inserted']} neu, {stats['duplicates']} doppelt, "
+        f"{stats['rejected']} verworfen ({mongo_calls} Mongo-Aufrufe)."
+    )
+    return stats
+
+
+def _fill_gap(ticker: str, source: str, gap_start: date, gap_end: date) -> int:
+    # ein anderer Aufruf kann die Lücke inzwischen gefüllt haben
+    if not missing_intervals(load_coverage(ticker, source), gap_start, gap_end):
+        return 0
+
+    trading_range = trim_to_trading_days(gap_start, gap_end)
+    if trading_range is None:
+        # nur Wochenenden/Feiertage -> ohne API-Aufruf als abgedeckt markieren
+        add_coverage(ticker, source, gap_start, gap_end)
+        return 0
+
+    stats = _run_pipeline_and_save(ticker, trading_range[0].isoformat(), trading_range[1].isoformat(), source)
+
+    # None = Abruf fehlgeschlagen -> später erneut versuchen; eine leere Antwort zählt nur
+    # bei wenigen Handelstagen (Sonderschließung) für abgeschlossene Tage als abgedeckt
+    if stats is None:
+        return 1
+    if stats.get("empty") and len(trading_days(*trading_range)) > EMPTY_GAP_MAX_DAYS:
+        print(f"Leere Antwort für {source}/{ticker} {gap_start} bis {gap_end} nicht als abgedeckt markiert.")
+        return 1
+    covered_end = min(gap_end, last_settled_day(), stats.get("covered_through", gap_end))
+    if covered_end >= gap_start:
+        add_coverage(ticker, source, gap_start, covered_end)
+    return 1
+
+
+@timed("ensure_stock")
+def _fill_stock_gaps(ticker: str, req_start: date, req_end: date, source: str) -> int:
+    """Holt nur die Teilzeiträume, die laut Manifest noch nie abgefragt wurden."""
+    fetch_end = min(req_end, date.today())
+    if fetch_end < req_start:
+        return 0
+
+    upstream_calls = 0
+    for gap_start, gap_end in missing_intervals(load_coverage(ticker, source), req_start, fetch_end):
+        # gleichzeitige Anfragen für dieselbe Lücke teilen sich einen Abruf
+        upstream_calls += coalesce(
+            (source, ticker, gap_start.isoformat(), gap_end.isoformat()),
+            lambda s=gap_start, e=gap_end: _fill_gap(ticker, source, s, e),
+        )
+
+    return upstream_calls
+
+
+def _read_settled_frame(ticker: str, req_start: date, req_end: date, source: str):
+    cached = columnar_cache.read(ticker, source, req_start, req_end)
+    if cached is not None:
+        return cached
+
+    # Datei um den angefragten Zeitraum erweitern, solange beide zusammenhängen
+    start, end = req_start, req_end
+    covered = columnar_cache.covered_range(ticker, source)
+    if covered is not None and covered[0] <= end + timedelta(days=1) and covered[1] >= start - timedelta(days=1):
+        start, end = min(start, covered[0]), max(end, covered[1])
+
+    # Manifest vor dem Lesen laden: add_coverage läuft erst nach dem Speichern, ein hier
+    # vollständiger Zeitraum ist im folgenden Read also komplett (auch bei anderen Prozessen)
+    complete = not missing_intervals(load_coverage(ticker, source), start, end)
+    gen = columnar_cache.generation(ticker, source)
+    frame = stock_store.read_frame(ticker, start, end, source)
+    if complete:
+        columnar_cache.write(ticker, source, frame, start, end, expected_generation=gen)
+
+    if frame is None or (start, end) == (req_start, req_end):
+        return frame
+    mask = (frame["date"] >= pd.Timestamp(req_start)) & (frame["date"] < pd.Timestamp(req_end + timedelta(days=1)))
+    return frame[mask].reset_index(drop=True)
+
+
+@timed("read_stock")
+def read_stock_frame(ticker: str, req_start: date, req_end: date, source: str):
+    settled_end = min(req_end, last_settled_day())
+    if not columnar_cache.ENABLED or settled_end < req_start:
+        return stock_store.read_frame(ticker, req_start, req_end, source)
+
+    # abgeschlossene Handelstage aus dem Spalten-Cache, den Rest aus MongoDB
+    frames = [_read_settled_frame(ticker, req_start, settled_end, source)]
+    if req_end > settled_end:
+        frames.append(stock_store.read_frame(ticker, settled_end + timedelta(days=1), req_end, source))
+
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return None
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def _collection_state(collection, match: dict):
+    """Anzahl, neuestes Datum und letzte Ingestion in einem Aggregations-Aufruf."""
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "last_date": {"$max": "$date"},
+            "last_ingest": {"$max": "$ingested_at"},
+        }},
+    ]
+    result = list(collection.aggregate(pipeline))
+    if not result:
+        return None
+    state = result[0]
+    state.pop("_id", None)
+    return state
 
-    if df is not None and not df.empty:
-        for _, row in df.iterrows():
-            try:
-                stockDaten(
-                    date=row["date"],
-                    ticker=row["ticker"],
-                    source=row["source"],
-                    open=row["open"],
-                    high=row["high"],
-                    low=row["low"],
-                    close=row["close"],
-                    adj_close=row.get("adj_close"),
-                    volume=row["volume"]
-                ).save()
-            except Exception:
-                pass
+
+def stock_data_state(ticker: str, req_start: date, req_end: date, source: str):
+    """Grundlage für ETag/Last-Modified, ohne die Kurse selbst zu laden."""
+    return stock_store.state(ticker, req_start, req_end, source)
+
+
+def ensure_stock_data(ticker: str, start_str: str, end_str: str, source: str) -> None:
+    _fill_stock_gaps(ticker, to_date(start_str), to_date(end_str), source)
 
 
 def fetch_and_store_stock_data(ticker: str, start_str: str, end_str: str, source: str):
     req_start = to_date(start_str)
     req_end = to_date(end_str)
 
-    last_entry = stockDaten.objects(ticker=ticker, source=source).order_by('-date').first()
+    _fill_stock_gaps(ticker, req_start, req_end, source)
+    return read_stock_frame(ticker, req_start, req_end, source)
 
-    fetch_start_date = req_start
 
-    if last_entry:
-        last_db_date = last_entry.date.date()
-        if last_db_date < req_end:
-            next_day = last_db_date + timedelta(days=1)
-            fetch_start_date = max(req_start, next_day)
-
-            if fetch_start_date <= req_end:
-                _run_pipeline_and_save(ticker, fetch_start_date.isoformat(), end_str, source)
-    else:
-        _run_pipeline_and_save(ticker, start_str, end_str, source)
-
-    qs = stockDaten.objects(
-        ticker=ticker,
-        source=source,
-        date__gte=req_start,
-        date__lte=req_end
-    ).order_by('date')
-
-    if not qs:
-        return None
+def fetch_and_store_stock_data_many(tickers, start_str: str, end_str: str, source: str,
+                                    max_workers: int = MAX_FETCH_WORKERS) -> dict:
+    """Füllt die Lücken aller Ticker parallel und liefert {ticker: DataFrame | None}."""
+    req_start = to_date(start_str)
+    req_end = to_date(end_str)
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as pool:
+        futures = {
+            ticker: pool.submit(_fill_stock_gaps, ticker, req_start, req_end, source)
+            for ticker in tickers
+        }
+        for ticker, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Fehler beim Abruf von {ticker} ({source}): {e}")
 
-    data_list = [
-        {
-            "date": doc.date, "open": doc.open, "high": doc.high, "low": doc.low,
-            "close": doc.close, "volume": doc.volume, "adj_close": doc.adj_close,
-            "ticker": doc.ticker, "source": doc.source
-        } for doc in qs
-    ]
-    return pd.DataFrame(data_list)
+    return {ticker: read_stock_frame(ticker, req_start, req_end, source) for ticker in tickers}
 
 
-def fetch_and_store_news_data(query: str, from_date_str: str):
+def _ensure_news_windows(query: str, req_start: date) -> None:
+    with span("upstream_newsapi"):
+        raw = get_news_from_news_api_parallel(query, req_start.isoformat(), window=NEWS_WINDOW)
+    if raw is None:
+        return
+
+    df_news = prepare_news_data(raw, query)
+    if not df_news.empty:
+        _bulk_save_news_frame(df_news, query)
+    # Cursor erst nach dem Speichern fortschreiben, damit ein Abbruch nichts verliert
+    mark_news_windows(query, raw["language"], raw["completedWindows"])
+
+
+def _ensure_news_data(query: str, from_date_str: str) -> None:
     req_start = to_date(from_date_str)
     today = datetime.now().date()
 
+    if NEWS_FETCH_MODE == "parallel":
+        _ensure_news_windows(query, req_start)
+        return
+
     last_entry = news_Daten.objects(query=query).order_by('-date').first()
 
     fetch_from = req_start
@@ -125,31 +361,98 @@ def fetch_and_store_news_data(query: str, from_date_str: str):
         df_news = run_news_pipeline(query, fetch_from.isoformat())
 
         if df_news is not None and not df_news.empty:
-            for _, row in df_news.iterrows():
-                exists = news_Daten.objects(title=row['title'], query=query).first()
-                if not exists:
-                    try:
-                        news_Daten(
-                            date=row["date"], title=row["title"],
-                            description=row.get("description"), content=row.get("content"),
-                            source=row.get("source"), query=row["query"],
-                            author=row.get("author"), url=row.get("url")
-                        ).save()
-                    except Exception:
-                        pass
-
-    qs = news_Daten.objects(query=query, date__gte=req_start).order_by('-date')
-
-    articles = [
-        {
-            "title": doc.title, "publishedAt": doc.date.isoformat(),
-            "source": {"name": doc.source}, "description": doc.description,
-            "url": doc.url, "author": doc.author, "content": doc.content
-        } for doc in qs
-    ]
+            _bulk_save_news_frame(df_news, query)
+
+
+@timed("ensure_news")
+def ensure_news_data(query: str, from_date_str: str) -> None:
+    # hat ein anderer Worker gerade abgerufen, reicht dessen Ergebnis in der DB
+    coalesce(
+        ("news", query, from_date_str),
+        lambda: _ensure_news_data(query, from_date_str),
+        after_wait=lambda: None,
+    )
+
+
+def news_data_state(query: str, from_date_str: str):
+    return _collection_state(news_Daten._get_collection(), {
+        "query": query,
+        "date": {"$gte": datetime.combine(to_date(from_date_str), datetime.min.time())},
+    })
+
+
+@timed("read_news")
+def read_news_data(query: str, from_date_str: str):
+    # Rohdokumente statt mongoengine-Objekten, wie bei den seitenweisen Abfragen
+    articles = list(iter_news_articles(query, from_date_str))
     return {"articles": articles, "totalResults": len(articles)}
 
 
+NEWS_SORT = [("date", DESCENDING), ("_id", DESCENDING)]
+NEWS_LIST_PROJECTION = {"title": 1, "date": 1, "source": 1, "description": 1, "url": 1, "author": 1}
+
+
+def encode_news_cursor(doc_date: datetime, doc_id: ObjectId) -> str:
+    raw = f"{doc_date.isoformat()}|{doc_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_news_cursor(value: str):
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode("utf-8")
+        date_part, id_part = raw.split("|", 1)
+        return datetime.fromisoformat(date_part), ObjectId(id_part)
+    except (ValueError, UnicodeDecodeError, InvalidId) as exc:
+        raise ValueError("Parameter 'after' ist ungültig") from exc
+
+
+def _news_article(doc: dict, include_content: bool = True) -> dict:
+    article = {
+        "title": doc.get("title"), "publishedAt": doc["date"].isoformat(),
+        "source": {"name": doc.get("source")}, "description": doc.get("description"),
+        "url": doc.get("url"), "author": doc.get("author"),
+    }
+    if include_content:
+        article["content"] = doc.get("content")
+    return article
+
+
+def _news_cursor(query: str, from_date_str: str, after=None, limit=None, include_content=True):
+    match = {"query": query, "date": {"$gte": datetime.combine(to_date(from_date_str), datetime.min.time())}}
+    if after is not None:
+        # Keyset-Pagination auf (date, _id) absteigend
+        after_date, after_id = after
+        match["$or"] = [
+            {"date": {"$lt": after_date}},
+            {"date": after_date, "_id": {"$lt": after_id}},
+        ]
+    projection = {**NEWS_LIST_PROJECTION, "content": 1} if include_content else NEWS_LIST_PROJECTION
+    cursor = news_Daten._get_collection().find(match, projection).sort(NEWS_SORT)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    return cursor
+
+
+def iter_news_articles(query: str, from_date_str: str, after=None, limit=None, include_content=True):
+    """Artikel direkt aus dem Mongo-Cursor, ohne sie vorher in eine Liste zu laden."""
+    for doc in _news_cursor(query, from_date_str, after, limit, include_content):
+        yield _news_article(doc, include_content)
+
+
+@timed("read_news")
+def read_news_page(query: str, from_date_str: str, limit: int, after=None, include_content=True) -> dict:
+    docs = list(_news_cursor(query, from_date_str, after, limit + 1, include_content))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_news_cursor(docs[-1]["date"], docs[-1]["_id"]) if has_more else None
+    return {"articles": [_news_article(doc, include_content) for doc in docs], "next": next_cursor}
+
+
+def fetch_and_store_news_data(query: str, from_date_str: str):
+    ensure_news_data(query, from_date_str)
+    return read_news_data(query, from_date_str)
+
+
 if __name__ == "__main__":
     print("Lade und speichere Testdaten")
     fetch_and_store_stock_data("MSFT", "2025-10-01", "2025-11-30", "yahoo")
@@ -0,0 +1,153 @@
+"""Hintergrund-Prefetch, der die unterstützten Symbole und News-Abfragen aktuell hält.
+
+Läuft als Thread im Flask-Prozess (``PREFETCH_ENABLED=1``) oder eigenständig
+über ``python scheduler.py``. Dank Coverage-Manifest werden nur echte Lücken
+abgerufen, Request-Handler lesen danach fast immer nur aus der Datenbank.
+
+Es arbeitet immer nur eine Instanz: jede hält sich über eine Lease in MongoDB
+(``fetch_lease``) als Leiter; die übrigen Worker warten, bis die Lease abläuft.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+from coverage import MARKET_TZ, next_session_settled
+from save_data import ensure_news_data, fetch_and_store_stock_data_many
+from singleflight import acquire_lease, new_owner, release_lease
+
+STOCK_LOOKBACK_DAYS = int(os.environ.get("PREFETCH_STOCK_LOOKBACK_DAYS", 365))
+NEWS_LOOKBACK_DAYS = 29
+NEWS_INTERVAL = timedelta(minutes=int(os.environ.get("PREFETCH_NEWS_INTERVAL_MINUTES", 180)))
+MAX_WORKERS = int(os.environ.get("PREFETCH_MAX_WORKERS", 4))
+JITTER_SECONDS = float(os.environ.get("PREFETCH_JITTER_SECONDS", 60))
+LEADER_KEY = "prefetch-scheduler"
+# muss länger sein als ein kompletter Prefetch-Durchlauf, erneuert wird bei jedem Aufwachen
+LEADER_TTL = float(os.environ.get("PREFETCH_LEASE_TTL", 1800))
+LEADER_RETRY_SECONDS = float(os.environ.get("PREFETCH_LEASE_RETRY_SECONDS", 60))
+
+
+class PrefetchScheduler:
+    def __init__(self, symbols: Iterable[str], news_queries: Iterable[str],
+                 source: str = "yahoo", max_workers: int = MAX_WORKERS,
+                 news_interval: timedelta = NEWS_INTERVAL, jitter: float = JITTER_SECONDS):
+        self.symbols = list(symbols)
+        self.news_queries = list(news_queries)
+        self.source = source
+        self.max_workers = max_workers
+        self.news_interval = news_interval
+        self.jitter = jitter
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owner = new_owner()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="prefetch-scheduler", daemon=True)
+        self._thread.start()
+        print(f"Prefetch gestartet: {len(self.symbols)} Symbole, {len(self.news_queries)} News-Abfragen.")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        release_lease(LEADER_KEY, self._owner)
+
+    def _is_leader(self) -> bool:
+        try:
+            return acquire_lease(LEADER_KEY, self._owner, LEADER_TTL)
+        except Exception as e:
+            print(f"Prefetch-Lease nicht erreichbar: {e}")
+            return False
+
+    def refresh_stocks(self) -> None:
+        today = date.today()
+        start = (today - timedelta(days=STOCK_LOOKBACK_DAYS)).isoformat()
+        t0 = time.perf_counter()
+        fetch_and_store_stock_data_many(self.symbols, start, today.isoformat(), self.source,
+                                        max_workers=self.max_workers)
+        print(f"Prefetch Kurse abgeschlossen ({time.perf_counter() - t0:.1f}s).")
+
+    def refresh_news(self) -> None:
+        from_date = (date.today() - timedelta(days=NEWS_LOOKBACK_DAYS)).isoformat()
+
+        def refresh(query: str) -> None:
+            # gestaffelt starten, damit nicht alle Anfragen gleichzeitig beim Anbieter landen
+            if self._stop.wait(random.uniform(0, self.jitter / 4)):
+                return
+            try:
+                ensure_news_data(query, from_date)
+            except Exception as e:
+                print(f"Prefetch News '{query}' fehlgeschlagen: {e}")
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            list(pool.map(refresh, self.news_queries))
+
+    def _safe(self, job) -> None:
+        try:
+            job()
+        except Exception as e:
+            print(f"Prefetch-Fehler in {job.__name__}: {e}")
+
+    def _run(self) -> None:
+        leading = False
+        next_stock = next_news = datetime.now(MARKET_TZ)
+        while not self._stop.is_set():
+            if not self._is_leader():
+                if leading:
+                    print("Prefetch: Lease verloren, eine andere Instanz übernimmt.")
+                leading = False
+                self._stop.wait(LEADER_RETRY_SECONDS)
+                continue
+            if not leading:
+                # direkt nach der Übernahme einmal alles aufwärmen
+                print("Prefetch: diese Instanz übernimmt.")
+                leading = True
+                next_stock = next_news = datetime.now(MARKET_TZ)
+
+            now = datetime.now(MARKET_TZ)
+            if now >= next_stock:
+                self._safe(self.refresh_stocks)
+                next_stock = next_session_settled() + timedelta(seconds=random.uniform(0, self.jitter))
+            if self.news_queries and now >= next_news:
+                self._safe(self.refresh_news)
+                next_news = datetime.now(MARKET_TZ) + self.news_interval + timedelta(seconds=random.uniform(0, self.jitter))
+
+            wake = min(next_stock, next_news) if self.news_queries else next_stock
+            # spätestens nach einem Drittel der TTL aufwachen und die Lease erneuern
+            sleep = min((wake - datetime.now(MARKET_TZ)).total_seconds(), LEADER_TTL / 3)
+            self._stop.wait(max(1.0, sleep))
+
+
+def _news_queries(symbols: List[str]) -> List[str]:
+    configured = os.environ.get("PREFETCH_NEWS_QUERIES")
+    if configured is None:
+        return symbols  # das Dashboard fragt News mit dem Ticker ab
+    return [q.strip() for q in configured.split(",") if q.strip()]
+
+
+def start_scheduler(symbols: Iterable[str]) -> PrefetchScheduler:
+    symbols = list(symbols)
+    scheduler = PrefetchScheduler(symbols, _news_queries(symbols))
+    scheduler.start()
+    return scheduler
+
+
+if __name__ == "__main__":
+    # nicht aus app importieren: das würde mit PREFETCH_ENABLED=1 einen zweiten Scheduler starten
+    from constants import SUPPORTED_SYMBOLS
+
+    scheduler = start_scheduler(SUPPORTED_SYMBOLS)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
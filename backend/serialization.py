@@ -0,0 +1,82 @@
+"""Vektorisierte Umwandlung von DataFrames in JSON-Payloads."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List
+
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import span, timed
+
+try:  # optional: deutlich schnellerer Encoder
+    import orjson
+except ImportError:  # pragma: no cover - Fallback auf die Standardbibliothek
+    orjson = None
+
+
+RESPONSE_FORMATS = ("rows", "columnar")
+
+
+def _format_dates(series: pd.Series) -> List[str]:
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        series = pd.to_datetime(series)
+    # datetime64[D] -> str ist um ein Vielfaches schneller als strftime pro Wert
+    return series.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(str).tolist()
+
+
+def _float_column(series: pd.Series) -> List[Any]:
+    values = series if series.dtype == "float64" else pd.to_numeric(series, errors="coerce").astype("float64")
+    if values.isna().any():
+        # NaN ist kein gültiges JSON -> null
+        return values.astype(object).where(values.notna(), None).tolist()
+    return values.tolist()
+
+
+def _int_column(series: pd.Series) -> List[int]:
+    return pd.to_numeric(series, errors="coerce").fillna(0).astype("int64").tolist()
+
+
+def frame_to_columns(
+    frame: pd.DataFrame,
+    columns: Dict[str, str],
+    int_columns: Iterable[str] = (),
+) -> Dict[str, List[Any]]:
+    """Wandelt ganze Spalten auf einmal um: ``{"date": [...], "close": [...], ...}``.
+
+    ``columns`` bildet den Namen im Payload auf die Spalte im DataFrame ab.
+    """
+    int_columns = set(int_columns)
+    result: Dict[str, List[Any]] = {"date": _format_dates(frame["date"])}
+    for key, column in columns.items():
+        series = frame[column] if column in frame.columns else pd.Series(index=frame.index, dtype="float64")
+        result[key] = _int_column(series) if key in int_columns else _float_column(series)
+    return result
+
+
+def columns_to_records(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+
+@timed("serialize")
+def serialize_frame(
+    frame: pd.DataFrame,
+    columns: Dict[str, str],
+    int_columns: Iterable[str] = (),
+    response_format: str = "rows",
+):
+    data = frame_to_columns(frame, columns, int_columns)
+    if response_format == "columnar":
+        return data
+    return columns_to_records(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask-JSON-Provider, der orjson verwendet, sofern installiert."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        with span("json"):
+            if orjson is None:
+                return super().dumps(obj, **kwargs)
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
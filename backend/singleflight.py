@@ -0,0 +1,135 @@
+"""Request-Coalescing: gleichzeitige identische Abrufe laufen nur einmal.
+
+Innerhalb eines Prozesses warten Folgeaufrufe auf das Ergebnis des ersten
+Aufrufs. Zwischen Prozessen sorgt eine Lease in MongoDB (``fetch_lease``)
+dafür, dass nur ein Worker den Upstream-Abruf ausführt.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import fetchLease
+
+LEASE_TTL = float(os.environ.get("FETCH_LEASE_TTL", 120))
+LEASE_WAIT_TIMEOUT = float(os.environ.get("FETCH_LEASE_WAIT_TIMEOUT", 60))
+LEASE_POLL_INTERVAL = 0.25
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def _lease_key(key: Hashable) -> str:
+    return "|".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+
+def new_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(key: Hashable, owner: str, ttl: float = LEASE_TTL) -> bool:
+    """Übernimmt die Lease, wenn sie frei oder abgelaufen ist (oder schon ``owner`` gehört)."""
+    lease_id = _lease_key(key)
+    collection = fetchLease._get_collection()
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=ttl)
+    taken = collection.find_one_and_update(
+        {"_id": lease_id, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+        {"$set": {"owner": owner, "expires_at": expires}},
+    )
+    if taken is not None:
+        return True
+    try:
+        collection.insert_one({"_id": lease_id, "owner": owner, "expires_at": expires})
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def release_lease(key: Hashable, owner: str) -> None:
+    fetchLease._get_collection().delete_one({"_id": _lease_key(key), "owner": owner})
+
+
+@contextmanager
+def mongo_lease(key: Hashable, ttl: float = LEASE_TTL, wait_timeout: float = LEASE_WAIT_TIMEOUT):
+    """Liefert True, wenn dieser Prozess die Lease hält, sonst False, nachdem der
+    Halter fertig ist (oder ``wait_timeout`` abgelaufen ist)."""
+    lease_id = _lease_key(key)
+    owner = new_owner()
+    collection = fetchLease._get_collection()
+
+    if acquire_lease(key, owner, ttl):
+        try:
+            yield True
+        finally:
+            release_lease(key, owner)
+        return
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        if collection.find_one({"_id": lease_id, "expires_at": {"$gte": datetime.utcnow()}}, {"_id": 1}) is None:
+            break
+        time.sleep(LEASE_POLL_INTERVAL)
+    yield False
+
+
+_single_flight = SingleFlight()
+
+
+def coalesce(key: Hashable, fn: Callable[[], Any], after_wait: Optional[Callable[[], Any]] = None) -> Any:
+    """Führt ``fn`` pro ``key`` nur einmal gleichzeitig aus, prozess- und workerübergreifend.
+
+    Hat ein anderer Prozess den Abruf erledigt, wird ``after_wait`` (Standard: ``fn``)
+    aufgerufen; ``fn`` sollte daher vorher prüfen, ob noch etwas zu tun ist.
+    """
+    def leader():
+        with mongo_lease(key) as owned:
+            if owned or after_wait is None:
+                return fn()
+            return after_wait()
+
+    return _single_flight.do(key, leader)
@@ -0,0 +1,310 @@
+"""
+Speicher-Layouts für Tageskurse.
+
+"document" ist das bisherige Layout (ein stockDaten-Dokument pro Tag), "bucket"
+legt pro (ticker, source, Monat) ein stockBucket-Dokument mit parallelen Arrays an.
+Ein Jahr Kurse sind damit 12-13 Dokumente statt ~250. Auswahl über STOCK_STORAGE.
+"""
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import stockBucket, stockDaten
+
+BULK_BATCH_SIZE = 1000
+READ_BATCH_SIZE = 5000
+BUCKET_WRITE_RETRIES = 3
+STOCK_STORAGE = os.environ.get("STOCK_STORAGE", "document")
+STOCK_FIELDS = ["open", "high", "low", "close", "adj_close", "volume"]
+# pro Zeile mitgespeichert, aber nicht Teil der gelesenen Kursreihe
+ROW_FIELDS = STOCK_FIELDS + ["provider"]
+FRAME_COLUMNS = ["date", "open", "high", "low", "close", "volume", "adj_close", "ticker", "source"]
+
+
+def to_mongo_dates(dates: pd.Series) -> list:
+    # tz-aware Zeitstempel (yfinance) wie pymongo nach UTC umrechnen, damit
+    # der Upsert-Key mit den bisher per .save() gespeicherten Daten übereinstimmt
+    dates = pd.to_datetime(dates)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert("UTC").dt.tz_localize(None)
+    return list(dates.dt.to_pydatetime())
+
+
+def _day_range(req_start: date, req_end: date):
+    # Yahoo-Kurse liegen nicht auf Mitternacht UTC, daher exklusiv bis zum Folgetag
+    return (
+        datetime.combine(req_start, datetime.min.time()),
+        datetime.combine(req_end + timedelta(days=1), datetime.min.time()),
+    )
+
+
+def frame_from_columns(data: dict, ticker: str, source: str):
+    """Baut aus Spaltenlisten direkt typisierte NumPy-Spalten (None -> NaN) und daraus den DataFrame."""
+    if not data["date"]:
+        return None
+    columns = {"date": np.array(data["date"], dtype="datetime64[ns]")}
+    for col in FRAME_COLUMNS[1:-2]:
+        columns[col] = np.array(data[col], dtype="float64")
+    frame = pd.DataFrame(columns, copy=False)
+    return frame.assign(ticker=ticker, source=source)
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _prepare_frame(df: pd.DataFrame, stats: dict):
+    """Verwirft Zeilen ohne Schlüssel und liefert (Datumsliste, Spalten als Python-Listen)."""
+    valid = df["date"].notna() & df["ticker"].notna() & df["source"].notna()
+    stats["rejected"] += int((~valid).sum())
+    df = df[valid]
+    if df.empty:
+        return df, [], {}
+
+    missing = {col: None for col in ROW_FIELDS if col not in df.columns}
+    if missing:
+        df = df.assign(**missing)
+
+    # Spaltenweise in Python-Objekte umwandeln statt Zeile für Zeile
+    columns = {col: _to_python(df[col]) for col in ROW_FIELDS}
+    return df, to_mongo_dates(df["date"]), columns
+
+
+def _to_python(series: pd.Series) -> list:
+    if series.dtype == np.float32:
+        # float32 (STOCK_FLOAT_DTYPE) nur im Speicher: über die kürzeste Dezimaldarstellung
+        # zurück nach float64, sonst landet 1.1 als 1.100000023841858 in MongoDB
+        series = pd.Series(series.to_numpy().astype(str).astype(np.float64), index=series.index)
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _state_pipeline(match: dict, count: str, last_date: str) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": count},
+            "last_date": {"$max": last_date},
+            "last_ingest": {"$max": "$ingested_at"},
+        }},
+    ]
+
+
+def _first_state(collection, pipeline: list):
+    result = list(collection.aggregate(pipeline))
+    if not result:
+        return None
+    state = result[0]
+    state.pop("_id", None)
+    return state
+
+
+class DocumentStore:
+    """Ein stockDaten-Dokument pro Handelstag (bisheriges Layout)."""
+
+    name = "document"
+
+    def save_frame(self, df: pd.DataFrame, batch_size: int = BULK_BATCH_SIZE) -> dict:
+        """Schreibt alle Zeilen als ungeordnete Upserts auf (ticker, source, date)."""
+        stats = {"inserted": 0, "updated": 0, "rejected": 0}
+        df, dates, columns = _prepare_frame(df, stats)
+        if df.empty:
+            return stats
+
+        tickers = df["ticker"].tolist()
+        sources = df["source"].tolist()
+
+        ingested_at = datetime.utcnow()
+        ops = []
+        for i, (d, t, s) in enumerate(zip(dates, tickers, sources)):
+            values = {col: columns[col][i] for col in ROW_FIELDS}
+            values["ingested_at"] = ingested_at
+            ops.append(UpdateOne({"ticker": t, "source": s, "date": d}, {"$set": values}, upsert=True))
+
+        collection = stockDaten._get_collection()
+        for offset in range(0, len(ops), batch_size):
+            batch = ops[offset:offset + batch_size]
+            try:
+                result = collection.bulk_write(batch, ordered=False)
+                details = result.bulk_api_result
+            except BulkWriteError as exc:
+                details = exc.details
+                stats["rejected"] += len(details.get("writeErrors", []))
+            stats["inserted"] += details.get("nUpserted", 0)
+            stats["updated"] += details.get("nMatched", 0)
+
+        return stats
+
+    def read_frame(self, ticker: str, req_start: date, req_end: date, source: str, raw: bool = True):
+        if not raw:
+            return self._read_frame_documents(ticker, req_start, req_end, source)
+
+        start, end = _day_range(req_start, req_end)
+        cursor = stockDaten._get_collection().find(
+            {"ticker": ticker, "source": source, "date": {"$gte": start, "$lt": end}},
+            {"_id": 0, "date": 1, **{col: 1 for col in STOCK_FIELDS}},
+        ).sort("date", ASCENDING).batch_size(READ_BATCH_SIZE)
+
+        data = {"date": []}
+        data.update({col: [] for col in STOCK_FIELDS})
+        for doc in cursor:
+            for key, values in data.items():
+                values.append(doc.get(key))
+        return frame_from_columns(data, ticker, source)
+
+    def _read_frame_documents(self, ticker: str, req_start: date, req_end: date, source: str):
+        """Bisheriger Lesepfad über mongoengine-Dokumente (Vergleichswert für Benchmarks)."""
+        qs = stockDaten.objects(
+            ticker=ticker,
+            source=source,
+            date__gte=req_start,
+            date__lt=req_end + timedelta(days=1)
+        ).order_by('date')
+
+        if not qs:
+            return None
+
+        data_list = [
+            {
+                "date": doc.date, "open": doc.open, "high": doc.high, "low": doc.low,
+                "close": doc.close, "volume": doc.volume, "adj_close": doc.adj_close,
+                "ticker": doc.ticker, "source": doc.source
+            } for doc in qs
+        ]
+        return pd.DataFrame(data_list)
+
+    def state(self, ticker: str, req_start: date, req_end: date, source: str):
+        start, end = _day_range(req_start, req_end)
+        return _first_state(stockDaten._get_collection(), _state_pipeline(
+            {"ticker": ticker, "source": source, "date": {"$gte": start, "$lt": end}},
+            1, "$date",
+        ))
+
+
+class BucketStore:
+    """Ein stockBucket-Dokument pro (ticker, source, Monat) mit parallelen Arrays."""
+
+    name = "bucket"
+
+    def _merge_bucket(self, existing: dict | None, rows: dict, ingested_at: datetime):
+        """Führt neue Tageswerte in einen Bucket ein und liefert (Dokument, neu, aktualisiert)."""
+        merged = {}
+        if existing is not None:
+            for i, d in enumerate(existing["dates"]):
+                merged[d] = {col: (existing.get(col) or [None] * len(existing["dates"]))[i] for col in ROW_FIELDS}
+        inserted = sum(1 for d in rows if d not in merged)
+        merged.update(rows)
+
+        dates = sorted(merged)
+        doc = {
+            "dates": dates,
+            **{col: [merged[d][col] for d in dates] for col in ROW_FIELDS},
+            "count": len(dates),
+            "last_date": dates[-1],
+            "ingested_at": ingested_at,
+            "version": (existing or {}).get("version", 0) + 1,
+        }
+        return doc, inserted, len(rows) - inserted
+
+    def save_frame(self, df: pd.DataFrame) -> dict:
+        """Liest die betroffenen Monats-Buckets einmal, mischt die Zeilen ein und ersetzt sie."""
+        stats = {"inserted": 0, "updated": 0, "rejected": 0}
+        df, dates, columns = _prepare_frame(df, stats)
+        if df.empty:
+            return stats
+
+        # {(ticker, source, monat): {datum: werte}}
+        groups = {}
+        for i, (d, t, s) in enumerate(zip(dates, df["ticker"].tolist(), df["source"].tolist())):
+            groups.setdefault((t, s, _month_start(d)), {})[d] = {col: columns[col][i] for col in ROW_FIELDS}
+
+        collection = stockBucket._get_collection()
+        pending = groups
+        for _ in range(BUCKET_WRITE_RETRIES):
+            keys = list(pending)
+            existing = {
+                (doc["ticker"], doc["source"], doc["month"]): doc
+                for doc in collection.find({"$or": [
+                    {"ticker": t, "source": s, "month": m} for t, s, m in keys
+                ]})
+            }
+
+            ingested_at = datetime.utcnow()
+            ops, counts = [], []
+            for key in keys:
+                ticker, source, month = key
+                old = existing.get(key)
+                doc, inserted, updated = self._merge_bucket(old, pending[key], ingested_at)
+                # optimistische Sperre: nur ersetzen, wenn niemand den Bucket inzwischen geändert hat
+                ops.append(ReplaceOne(
+                    {"ticker": ticker, "source": source, "month": month,
+                     "version": old["version"] if old else 0},
+                    {"ticker": ticker, "source": source, "month": month, **doc},
+                    upsert=True,
+                ))
+                counts.append((inserted, updated))
+
+            try:
+                collection.bulk_write(ops, ordered=False)
+                failed = set()
+            except BulkWriteError as exc:
+                failed = {error["index"] for error in exc.details.get("writeErrors", [])}
+
+            for index, (inserted, updated) in enumerate(counts):
+                if index not in failed:
+                    stats["inserted"] += inserted
+                    stats["updated"] += updated
+
+            pending = {keys[index]: pending[keys[index]] for index in failed}
+            if not pending:
+                break
+
+        stats["rejected"] += sum(len(rows) for rows in pending.values())
+        return stats
+
+    def read_frame(self, ticker: str, req_start: date, req_end: date, source: str):
+        start, end = _day_range(req_start, req_end)
+        docs = stockBucket._get_collection().find(
+            {"ticker": ticker, "source": source, "month": {"$gte": _month_start(start), "$lt": end}},
+            {"_id": 0, "dates": 1, **{col: 1 for col in STOCK_FIELDS}},
+        ).sort("month", ASCENDING)
+
+        data = {"date": []}
+        data.update({col: [] for col in STOCK_FIELDS})
+        for doc in docs:
+            data["date"].extend(doc["dates"])
+            for col in STOCK_FIELDS:
+                data[col].extend(doc.get(col) or [None] * len(doc["dates"]))
+
+        frame = frame_from_columns(data, ticker, source)
+        if frame is None:
+            return None
+        dates = frame["date"].to_numpy()
+        mask = (dates >= np.datetime64(start)) & (dates < np.datetime64(end))
+        if not mask.any():
+            return None
+        return frame[mask].reset_index(drop=True)
+
+    def state(self, ticker: str, req_start: date, req_end: date, source: str):
+        # auf Monatsebene: ändert sich ein Bucket, ändert sich auch das ETag
+        start, end = _day_range(req_start, req_end)
+        return _first_state(stockBucket._get_collection(), _state_pipeline(
+            {"ticker": ticker, "source": source, "month": {"$gte": _month_start(start), "$lt": end}},
+            "$count", "$last_date",
+        ))
+
+
+STORES = {store.name: store for store in (DocumentStore(), BucketStore())}
+
+
+def get_store(name: str = STOCK_STORAGE):
+    if name not in STORES:
+        raise ValueError(f"Unbekanntes Speicher-Layout '{name}' (erlaubt: {', '.join(STORES)})")
+    return STORES[name]
+
+
+stock_store = get_store()
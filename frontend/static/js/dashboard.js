@@ -110,29 +110,6 @@ const renderNews = (articles) => {
   });
 };
 
-const deriveForecast = (records) => {
-  if (!records.length) return { labels: [], values: [] };
-  const closes = records.map((entry) => entry.close);
-  const lastDate = new Date(records[records.length - 1].date);
-  let avgDelta = 0;
-  for (let i = 1; i < closes.length; i += 1) {
-    avgDelta += closes[i] - closes[i - 1];
-  }
-  avgDelta /= Math.max(1, closes.length - 1);
-
-  const labels = [];
-  const values = [];
-  let lastValue = closes[closes.length - 1];
-  for (let day = 1; day <= 30; day += 1) {
-    lastValue += avgDelta;
-    const futureDate = new Date(lastDate);
-    futureDate.setDate(lastDate.getDate() + day);
-    labels.push(formatDate(futureDate));
-    values.push(Number(lastValue.toFixed(2)));
-  }
-  return { labels, values };
-};
-
 const buildParams = (params) => new URLSearchParams(params).toString();
 
 const fetchJson = async (url) => {
@@ -174,7 +151,7 @@ const attachInteractions = () => {
   );
   const forecastChart = createChart(
     document.getElementById('forecast-chart').getContext('2d'),
-    'Prognose (naiv)',
+    'Prognose (Trend)',
   );
 
   const state = {
@@ -192,14 +169,16 @@ const attachInteractions = () => {
 
     setStatus('Lade Kursdaten...', 'loading');
     try {
-      const stockQuery = buildParams({ symbol, start, end });
+      const stockQuery = buildParams({ symbol, start, end, format: 'columnar' });
       const stockData = await fetchJson(`/api/stocks/yf?${stockQuery}`);
-      const labels = stockData.data.map((entry) => entry.date);
-      const values = stockData.data.map((entry) => entry.close);
+      // Spaltenformat: Chart.js kann die Arrays direkt übernehmen
+      const { date: labels, close: values } = stockData.data;
       updateChart(state.historicalChart, labels, values);
 
-      const forecast = deriveForecast(stockData.data);
-      updateChart(state.forecastChart, forecast.labels, forecast.values, '#a855f7');
+      // Prognose wird serverseitig berechnet und pro Handelstag gecacht
+      const forecastQuery = buildParams({ symbol, format: 'columnar' });
+      const forecastData = await fetchJson(`/api/forecast?${forecastQuery}`);
+      updateChart(state.forecastChart, forecastData.data.date, forecastData.data.forecast, '#a855f7');
 
       state.lastSymbol = symbol;
       state.lastStart = start;
@@ -223,7 +202,8 @@ const attachInteractions = () => {
 
     setStatus('Lade News...', 'loading');
     try {
-      const newsQuery = buildParams({ query: symbol, from: newsFrom });
+      // nur die angezeigten Artikel, ohne Volltext
+      const newsQuery = buildParams({ query: symbol, from: newsFrom, limit: 10, fields: 'list' });
       const newsData = await fetchJson(`/api/news?${newsQuery}`);
       renderNews(newsData.articles || []);
       setStatus('Analyse abgeschlossen', 'done');